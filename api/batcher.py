@@ -0,0 +1,140 @@
+"""Micro-batching de peticiones concurrentes de una fila.
+
+Cada ``submit`` deja su elemento en una lista pendiente y espera un future. Un
+lote sale cuando junta ``max_batch_size`` elementos o cuando el más antiguo
+lleva ``max_wait`` segundos esperando, lo que ocurra antes, así que la latencia
+añadida a una petición aislada está acotada por la ventana. El lote se procesa
+con una sola llamada a ``process(items)`` en un pool de ``workers`` hilos,
+fuera del event loop, y cada future se resuelve con su resultado.
+
+Si todos los hilos están ocupados no se despacha nada: las peticiones que
+siguen llegando se suman al siguiente lote. Bajo ráfagas el tamaño del lote
+crece solo; con poco tráfico los lotes son de una fila.
+
+``await close()`` deja de aceptar elementos, despacha ya lo que esperaba su
+ventana y espera a los lotes en curso sin bloquear el event loop.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class MicroBatcher:
+    def __init__(self, process, max_batch_size=64, max_wait=0.002, workers=1, name='micro-batch'):
+        # process(items) -> [resultado por elemento], en el mismo orden
+        self._process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix=name)
+        self._loop = None
+        self._pending = []
+        self._inflight = 0
+        self._timer = None
+        self._tasks = set()
+        self._closed = False
+        self.submitted = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.failed_batches = 0
+
+    async def submit(self, item):
+        if self._closed:
+            raise RuntimeError("micro-batcher is closed")
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Primer uso, o un event loop nuevo (p. ej. otro TestClient) sin nada pendiente del anterior
+            if self._pending or self._inflight:
+                raise RuntimeError("micro-batcher is bound to another event loop")
+            self._loop = loop
+        future = loop.create_future()
+        self._pending.append((item, future, loop.time()))
+        self.submitted += 1
+        self._schedule()
+        return await future
+
+    def _schedule(self):
+        now = self._loop.time()
+        dispatched = False
+        while self._pending and self._inflight < self.workers:
+            full = len(self._pending) >= self.max_batch_size
+            expired = now - self._pending[0][2] >= self.max_wait
+            if not (full or expired):
+                break
+            self._dispatch()
+            dispatched = True
+
+        # Un único temporizador, para el elemento más antiguo; con los hilos ocupados no hace falta
+        if self._timer is not None and (dispatched or not self._pending or self._inflight >= self.workers):
+            self._timer.cancel()
+            self._timer = None
+        if self._timer is None and self._pending and self._inflight < self.workers and not self._closed:
+            delay = self._pending[0][2] + self.max_wait - now
+            self._timer = self._loop.call_later(max(delay, 0.0), self._on_timer)
+
+    def _dispatch(self):
+        batch = self._pending[:self.max_batch_size]
+        del self._pending[:self.max_batch_size]
+        self._inflight += 1
+        task = self._loop.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_timer(self):
+        self._timer = None
+        self._schedule()
+
+    async def _run(self, batch):
+        items = [item for item, _, _ in batch]
+        metrics.MICRO_BATCH_SIZE.observe(len(items))
+        try:
+            results = await self._loop.run_in_executor(self._executor, self._process, items)
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.batches += 1
+            self.batched_rows += len(items)
+            self._inflight -= 1
+            # Lo que se acumuló mientras este lote estaba en vuelo sale ya si su ventana ha vencido
+            self._schedule()
+
+    async def close(self, timeout=30.0):
+        """Deja de aceptar elementos, despacha lo pendiente y espera a los lotes en curso."""
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            # Lo que aún esperaba su ventana sale ya, sin esperar a que haya hilos libres (el pool lo encola)
+            while self._pending:
+                self._dispatch()
+            if self._tasks:
+                await asyncio.wait(set(self._tasks), timeout=timeout)
+        else:
+            # Elementos de un event loop que ya no corre: no se pueden despachar, se fallan de forma explícita
+            pending, self._pending = self._pending, []
+            for _, future, _ in pending:
+                if not future.done():
+                    future.set_exception(RuntimeError("micro-batcher closed before the item was dispatched"))
+        # shutdown espera a los hilos: fuera del event loop
+        await loop.run_in_executor(None, self._executor.shutdown)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "inflight": self._inflight,
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": self.batched_rows / self.batches if self.batches else None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1e3,
+        }
@@ -0,0 +1,433 @@
+"""Benchmark de latencia y carga de la API de predicción.
+
+Genera payloads ``FeatureSchema`` sintéticos y mide:
+
+- ``stages``: coste de cada etapa de ``crud.post_data`` por separado (validación,
+  codificación, inferencia y persistencia), fila a fila y por lotes.
+- ``asgi``: ``/predict/`` y ``/predict/batch`` contra la app en el mismo proceso
+  (httpx + ASGITransport), con N peticiones concurrentes.
+- ``uvicorn``: lo mismo contra un uvicorn local lanzado en un subproceso.
+- ``serve``: contra ``serve.py`` (modelo precargado y workers con fork) con
+  cada número de workers de ``--workers``, midiendo también el RSS y el PSS de
+  todos los procesos. ``uvicorn_workers`` hace lo mismo con
+  ``uvicorn --workers N``, donde cada worker carga su propia copia, para comparar.
+
+Todo corre sin red ni MySQL: la base de datos es un SQLite temporal y la caché
+de predicciones está desactivada salvo con ``--cache``. Los resultados se
+guardan en JSON; ``--baseline`` compara con una ejecución anterior y termina con
+código 1 si alguna métrica empeora más que ``--tolerance``.
+
+Uso:
+    python benchmark.py --drivers stages,asgi,uvicorn --requests 2000 --concurrency 16 \\
+        --output bench.json [--baseline main.json] [--data ruta_csv]
+    python benchmark.py --drivers serve,uvicorn_workers --workers 1,2,4 --threads 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from encoder import COLUMN_TO_FIELD, FIELDS, NUMERIC_FIELDS, RATING_FIELDS
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def configure(db_path, cache=False, micro_batch=False):
+    """Variables de entorno para la API; hay que llamarla antes de importar db/crud/main."""
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['DB_ASYNC'] = '0'
+    os.environ['WRITE_BEHIND'] = '0'
+    os.environ['MICRO_BATCH'] = '1' if micro_batch else '0'
+    os.environ['MODEL_RELOAD_INTERVAL'] = '0'
+    os.environ['PREDICTION_CACHE_SIZE'] = os.environ.get('PREDICTION_CACHE_SIZE', '4096') if cache else '0'
+    return dict(os.environ)
+
+
+def synthetic_payloads(n, seed=0, csv_path=None):
+    """Payloads con la distribución de entrenamiento.
+
+    Con ``csv_path`` se remuestrean filas reales del dataset. Si no, se usan las
+    marginales guardadas en el pipeline: las numéricas con una gamma que reproduce
+    la media y desviación del StandardScaler (asimétrica para los retrasos, casi
+    normal para la edad) y las categóricas con las categorías del OneHotEncoder.
+    """
+    rng = np.random.default_rng(seed)
+    if csv_path:
+        import pandas as pd
+
+        df = pd.read_csv(csv_path)
+        df['Arrival Delay in Minutes'] = df['Arrival Delay in Minutes'].fillna(df['Departure Delay in Minutes'])
+        rows = df.iloc[rng.integers(0, len(df), n)]
+        columns = {COLUMN_TO_FIELD[c]: rows[c].tolist() for c in COLUMN_TO_FIELD}
+    else:
+        from registry import ModelRegistry
+
+        features = ModelRegistry(reload_interval=0).get().features
+        columns = {}
+        for field, mean, scale in zip(features.num_fields, features.num_mean, features.num_scale):
+            shape, theta = (mean / scale) ** 2, scale ** 2 / mean
+            columns[field] = rng.gamma(shape, theta, n).round().astype(int).tolist()
+        for field, lookup in features.cat_index.items():
+            vocab = list(lookup)
+            columns[field] = [vocab[i] for i in rng.integers(0, len(vocab), n)]
+
+    payloads = []
+    for i in range(n):
+        payload = {}
+        for field in FIELDS:
+            value = columns[field][i]
+            payload[field] = int(value) if field in NUMERIC_FIELDS or field in RATING_FIELDS else str(value)
+        payloads.append(payload)
+    return payloads
+
+
+def summarize(seconds, wall=None, rows=None):
+    ms = np.asarray(seconds, dtype=np.float64) * 1e3
+    out = {
+        "n": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+    if wall:
+        out["throughput_rps"] = len(ms) / wall
+        if rows is not None:
+            out["rows_per_s"] = rows / wall
+    return out
+
+
+def run_stages(payloads, batch_size):
+    """Cada etapa de crud.post_data / crud.post_batch cronometrada por separado."""
+    from sqlalchemy import insert
+
+    import crud
+    import model
+    import summary
+    from db import SessionLocal, init_db
+
+    init_db()
+    bundle = crud.registry.get()
+    clf, features = bundle.classifier, bundle.features
+    timings = {stage: [] for stage in ('validation', 'encoding', 'inference', 'persistence', 'total')}
+    db = SessionLocal()
+    try:
+        for payload in payloads:
+            t0 = time.perf_counter()
+            record = model.FeatureSchema.model_validate(payload).model_dump()
+            t1 = time.perf_counter()
+            x = features.encode(record)
+            t2 = time.perf_counter()
+            proba = clf.predict_proba(x)[0]
+            record['prediction'] = int(clf.classes_[proba.argmax()])
+            t3 = time.perf_counter()
+            db.add(model.Data(**record))
+            for stmt, params in summary.upsert_statements([record]):
+                db.execute(stmt, params)
+            db.commit()
+            t4 = time.perf_counter()
+            for stage, dt in zip(timings, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0)):
+                timings[stage].append(dt)
+
+        batch_timings = {stage: [] for stage in timings}
+        for start in range(0, len(payloads), batch_size):
+            chunk = payloads[start:start + batch_size]
+            t0 = time.perf_counter()
+            records = [model.FeatureSchema.model_validate(p).model_dump() for p in chunk]
+            t1 = time.perf_counter()
+            x = features.encode_records(records)
+            t2 = time.perf_counter()
+            preds = clf.classes_[clf.predict_proba(x).argmax(axis=1)]
+            for record, pred in zip(records, preds):
+                record['prediction'] = int(pred)
+            t3 = time.perf_counter()
+            db.execute(insert(model.Data), records)
+            for stmt, params in summary.upsert_statements(records):
+                db.execute(stmt, params)
+            db.commit()
+            t4 = time.perf_counter()
+            for stage, dt in zip(batch_timings, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0)):
+                batch_timings[stage].append(dt)
+    finally:
+        db.close()
+
+    return {
+        "single": {stage: summarize(ts) for stage, ts in timings.items()},
+        f"batch_{batch_size}": {stage: summarize(ts) for stage, ts in batch_timings.items()},
+    }
+
+
+async def drive(client, payloads, concurrency, batch_size):
+    """``/predict/`` fila a fila y ``/predict/batch`` por bloques, con ``concurrency`` peticiones en vuelo."""
+
+    async def load(method, bodies):
+        latencies, failures = [], 0
+        pending = iter(bodies)
+
+        async def worker():
+            nonlocal failures
+            for body in pending:
+                t0 = time.perf_counter()
+                response = await method(body)
+                latencies.append(time.perf_counter() - t0)
+                if response.status_code != 200 or response.json().get('msg') != 'ok':
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - start, failures
+
+    results = {}
+    latencies, wall, failures = await load(lambda p: client.post('/predict/', json=p), payloads)
+    results['predict'] = {**summarize(latencies, wall, len(payloads)), "failures": failures}
+
+    chunks = [payloads[i:i + batch_size] for i in range(0, len(payloads), batch_size)]
+    latencies, wall, failures = await load(lambda c: client.post('/predict/batch', json=c), chunks)
+    results[f'batch_{batch_size}'] = {**summarize(latencies, wall, len(payloads)), "failures": failures}
+    return results
+
+
+async def run_asgi(payloads, concurrency, batch_size):
+    import httpx
+
+    import main
+
+    # ASGITransport no lanza el lifespan: se abre a mano (esquema + carga del modelo)
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            return await drive(client, payloads, concurrency, batch_size)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _process_tree(pid):
+    # pid y todos sus descendientes, leyendo el ppid de /proc/<pid>/stat
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    tree, frontier = [pid], [pid]
+    while frontier:
+        frontier = [child for child, parent in parents.items() if parent in frontier]
+        tree.extend(frontier)
+    return tree
+
+
+def memory_usage(pid):
+    """RSS y PSS (MB) del servidor y sus workers; el PSS reparte las páginas compartidas entre procesos."""
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        return None
+    totals = {'Rss': 0, 'Pss': 0}
+    processes = 0
+    for p in _process_tree(pid):
+        try:
+            with open(f'/proc/{p}/smaps_rollup') as f:
+                for line in f:
+                    key, _, rest = line.partition(':')
+                    if key in totals:
+                        totals[key] += int(rest.split()[0])
+            processes += 1
+        except OSError:
+            pass
+    return {"processes": processes, "rss_mb": totals['Rss'] / 1024, "pss_mb": totals['Pss'] / 1024}
+
+
+async def run_server(command, payloads, concurrency, batch_size, env, startup_timeout=60.0):
+    """Lanza ``command`` (con ``{port}``) en un subproceso, lo carga con ``drive`` y mide su memoria."""
+    import httpx
+
+    port = _free_port()
+    proc = subprocess.Popen([arg.format(port=port) for arg in command], cwd=API_DIR, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"{command[1]} exited with code {proc.returncode}")
+                try:
+                    if (await client.get('/health')).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{command[1]} did not become healthy in time")
+                await asyncio.sleep(0.1)
+            results = await drive(client, payloads, concurrency, batch_size)
+            # Después de la carga: cuenta las páginas que los workers han llegado a tocar
+            results['memory'] = memory_usage(proc.pid)
+            return results
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def run_uvicorn(payloads, concurrency, batch_size, env, workers=1):
+    command = [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', '{port}',
+               '--log-level', 'warning', '--no-access-log']
+    if workers > 1:
+        # Cada worker de uvicorn importa la API y carga el modelo por su cuenta
+        command += ['--workers', str(workers)]
+    return await run_server(command, payloads, concurrency, batch_size, env)
+
+
+async def run_serve(payloads, concurrency, batch_size, env, workers, threads=1):
+    command = [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', '{port}',
+               '--workers', str(workers), '--threads', str(threads)]
+    return await run_server(command, payloads, concurrency, batch_size, env)
+
+
+def run_scaling(runner, payloads, concurrency, batch_size, env, db_path, worker_counts, **kwargs):
+    """Throughput y memoria de 1 a N workers; cada ejecución parte de una base de datos vacía."""
+    results = {}
+    import db
+
+    for workers in worker_counts:
+        db.engine.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        # Esquema creado aquí (DB_CREATE_SCHEMA=0): los workers de uvicorn lo crearían a la vez y chocarían
+        db.init_db()
+        db.engine.dispose()
+        results[f'workers_{workers}'] = asyncio.run(
+            runner(payloads, concurrency, batch_size, env, workers=workers, **kwargs))
+    return results
+
+
+def metadata(args):
+    import sklearn
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=API_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "config": {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+    }
+
+
+def _flatten(results, prefix=''):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{key}.')
+        else:
+            yield f'{prefix}{key}', value
+
+
+def compare(current, baseline, tolerance):
+    """Métricas que empeoran más de ``tolerance`` (latencias que suben, throughput que baja)."""
+    old = dict(_flatten(baseline['results']))
+    regressions = []
+    for name, value in _flatten(current['results']):
+        before = old.get(name)
+        if not before or not isinstance(value, (int, float)):
+            continue
+        if name.endswith(('p50_ms', 'p95_ms', 'p99_ms')):
+            change = value / before - 1
+        elif name.endswith(('throughput_rps', 'rows_per_s')):
+            change = before / value - 1 if value else float('inf')
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": before, "current": value, "change": change})
+    return regressions
+
+
+def print_report(results):
+    for name, value in _flatten(results):
+        if name.endswith(('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'rows_per_s', 'rss_mb', 'pss_mb')):
+            print(f"{name:<55}{value:>12.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--drivers', default='stages,asgi,uvicorn')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data', default=None, help='CSV del dataset para remuestrear filas reales')
+    parser.add_argument('--cache', action='store_true', help='mantener la caché de predicciones activa')
+    parser.add_argument('--micro-batch', action='store_true', help='servir /predict/ con MICRO_BATCH=1')
+    parser.add_argument('--workers', default='1,2,4', help='números de workers para serve y uvicorn_workers')
+    parser.add_argument('--threads', type=int, default=1, help='hilos de BLAS/OpenMP por worker de serve')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+    drivers = [d.strip() for d in args.drivers.split(',') if d.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='airline-bench-')
+    try:
+        db_path = os.path.join(workdir, 'bench.db')
+        env = configure(db_path, cache=args.cache, micro_batch=args.micro_batch)
+        payloads = synthetic_payloads(args.requests, args.seed, args.data)
+        results = {}
+        if 'stages' in drivers:
+            results['stages'] = run_stages(payloads, args.batch_size)
+        if 'asgi' in drivers:
+            results['asgi'] = asyncio.run(run_asgi(payloads, args.concurrency, args.batch_size))
+        if 'uvicorn' in drivers:
+            results['uvicorn'] = asyncio.run(run_uvicorn(payloads, args.concurrency, args.batch_size, env))
+        worker_counts = [int(w) for w in args.workers.split(',')]
+        # run_scaling crea el esquema antes de arrancar cada servidor
+        scaling_env = {**env, 'DB_CREATE_SCHEMA': '0'}
+        if 'serve' in drivers:
+            results['serve'] = run_scaling(run_serve, payloads, args.concurrency, args.batch_size, scaling_env,
+                                           db_path, worker_counts, threads=args.threads)
+        if 'uvicorn_workers' in drivers:
+            results['uvicorn_workers'] = run_scaling(run_uvicorn, payloads, args.concurrency, args.batch_size,
+                                                     scaling_env, db_path, worker_counts)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"meta": metadata(args), "results": results}
+    print_report(results)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['metric']}: {r['baseline']:.3f} -> {r['current']:.3f} ({r['change']:+.0%})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Caché de predicciones con clave canónica, desalojo LRU/TTL y contadores.
+
+Casi todos los campos de FeatureSchema tienen un rango pequeño (valoraciones 1-5,
+categorías de baja cardinalidad), así que el tráfico repite mucho los mismos
+vectores. Un acierto devuelve la predicción sin codificar ni pasar por el modelo.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from encoder import FIELDS
+
+
+def canonical_key(record):
+    # 3.0 y 3 deben ser la misma clave (el encoder los puntúa igual). Los textos van tal cual: ' Business' no es
+    # una categoría conocida y puntúa distinto que 'Business', así que no pueden compartir entrada
+    key = []
+    for field in FIELDS:
+        v = record[field]
+        if isinstance(v, float) and v.is_integer():
+            v = int(v)
+        key.append(v)
+    return tuple(key)
+
+
+def cached_prediction(cache, bundle, record):
+    """(predicción, probabilidad) de un registro con el modelo de ``bundle``, pasando por la caché."""
+    key = (bundle.version, canonical_key(record))
+    result = cache.get(key)
+    if result is None:
+        classifier = bundle.classifier
+        with metrics.FEATURE_BUILD.time('single'):
+            x = bundle.features.encode(record)
+        with metrics.INFERENCE.time('single'):
+            proba = classifier.predict_proba(x)[0]
+        result = (int(classifier.classes_[proba.argmax()]), float(proba[1]))
+        cache.put(key, result)
+    return result
+
+
+def cached_predictions(cache, bundle, records, mode='microbatch'):
+    """``cached_prediction`` para varios registros: los fallos de caché se codifican y puntúan en una sola llamada."""
+    keys = [(bundle.version, canonical_key(record)) for record in records]
+    results = [cache.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        classifier = bundle.classifier
+        with metrics.FEATURE_BUILD.time(mode):
+            x = bundle.features.encode_records([records[i] for i in missing])
+        with metrics.INFERENCE.time(mode):
+            proba = classifier.predict_proba(x)
+        preds = classifier.classes_[proba.argmax(axis=1)]
+        for i, pred, p in zip(missing, preds, proba[:, 1]):
+            results[i] = (int(pred), float(p))
+            cache.put(keys[i], results[i])
+    return results
+
+
+class PredictionCache:
+    def __init__(self, maxsize=4096, ttl=3600.0, version=None, check_interval=1.0):
+        """``version`` es un callable que identifica el modelo cargado (p. ej. el mtime
+        del fichero); si cambia, se vacía la caché. Se consulta como mucho cada
+        ``check_interval`` segundos para no hacer un stat por petición."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._version = version
+        self._check_interval = check_interval
+        self._current = version() if version else None
+        self._next_check = time.monotonic() + check_interval
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def _check_version(self, now):
+        if self._version is None or now < self._next_check:
+            return
+        self._next_check = now + self._check_interval
+        current = self._version()
+        if current != self._current:
+            self._current = current
+            self._data.clear()
+            self.invalidations += 1
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(now)
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires < now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
@@ -1,64 +1,306 @@
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-import joblib
-import pandas as pd
+from starlette.concurrency import run_in_threadpool
+import logging
+import os
 
+import metrics
 import model
+import summary
+from batcher import MicroBatcher
+from cache import PredictionCache, cached_prediction, cached_predictions, canonical_key
+from db import SessionLocal
+from drift import load_monitor
+from writer import WriteBehindQueue
+from registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+# Pipeline, encoder y clasificador (sklearn o INFERENCE_ENGINE=compiled) viven en el registro;
+# se cargan en el arranque de la API y se recargan en caliente si cambia MODEL_PATH
+registry = ModelRegistry()
+
+# Caché de predicciones; se vacía cuando el registro cambia de versión del modelo
+cache = PredictionCache(
+    maxsize=int(os.getenv('PREDICTION_CACHE_SIZE', 4096)),
+    ttl=float(os.getenv('PREDICTION_CACHE_TTL', 3600)),
+    version=lambda: registry.version,
+    check_interval=0,
+)
+
+# WRITE_BEHIND=1: las filas se insertan por lotes en segundo plano en lugar de en la petición
+if os.getenv('WRITE_BEHIND', '0') == '1':
+    writer = WriteBehindQueue(
+        SessionLocal, model.Data,
+        maxsize=int(os.getenv('WRITE_BEHIND_QUEUE_SIZE', 10000)),
+        batch_size=int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 500)),
+        flush_interval=float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 0.5)),
+        max_retries=int(os.getenv('WRITE_BEHIND_MAX_RETRIES', 3)),
+        dead_letter_path=os.getenv('WRITE_BEHIND_DEAD_LETTER', 'dead_letter.ndjson'),
+        extra_statements=summary.upsert_statements,
+    )
+else:
+    writer = None
+
+# Drift de las características frente a la referencia de entrenamiento (DRIFT_REFERENCE); None si no hay referencia
+drift_monitor = load_monitor()
+
+
+def predict_record(data_db, bundle=None):
+	# (predicción, probabilidad) de un registro, pasando por la caché
+	return cached_prediction(cache, bundle or registry.get(), data_db)
+
+
+def prediction_result(data_db, explain=False):
+	# Añade 'prediction' a data_db y devuelve la respuesta de crud; la explicación usa la misma versión
+	# (y se omite si el modelo no es explicable)
+	bundle = registry.get()
+	data_db['prediction'] = predict_record(data_db, bundle)[0]
+	metrics.PREDICTIONS.inc(str(data_db['prediction']))
+	if drift_monitor is not None:
+		drift_monitor.observe(data_db)
+	result = {"pred": data_db['prediction']}
+	if explain and bundle.explainer is not None:
+		result["explanation"] = {"model_version": bundle.version, **bundle.explainer.explain(data_db)}
+	return result
+
+
+def record_error(operation, error):
+	metrics.ERRORS.inc(operation, type(error).__name__)
+	logger.exception("%s failed: %s", operation, error)
+
+
+def post_data(db: Session, datax: model.FeatureSchema, explain=False):
+
+	data_db = datax.model_dump()
 
-with open('../model_pipeline.pkl', 'rb') as f:
-    pipeline = joblib.load('../model_pipeline.pkl')
-
-def ages():
-	r_age = range(5, 101)[::5]
-	dict_age = {}
-	j = 0
-	for i in r_age:
-		key = f"{j}-{i}"
-		value = range(j, i)
-		dict_age[key] = value
-		j = i
-	return dict_age
-
-def which_age(num):
-	range_age = ages()
-	# btw_age = (k for k, v in range_age.items() if num in v)
-	# return btw_age
-	for k, v in range_age.items():
-		if num in v:
-			return k
-
-
-def post_data(db: Session, datax: model.FeatureSchema):
-
-	x_dict = datax.model_dump()
-	x_dict['Age Group'] = which_age(x_dict['age'])
-	x_dict['arrival_dealy'] = float(x_dict['arrival_dealy'])
-
-	cols = ['Gender', 'Customer Type', 'Age', 'Type of Travel', 'Class',
-       'Flight Distance', 'Inflight wifi service',
-       'Departure/Arrival time convenient', 'Ease of Online booking',
-       'Gate location', 'Food and drink', 'Online boarding', 'Seat comfort',
-       'Inflight entertainment', 'On-board service', 'Leg room service',
-       'Baggage handling', 'Checkin service', 'Inflight service',
-       'Cleanliness', 'Departure Delay in Minutes', 'Arrival Delay in Minutes',
-       'Age Group']
-	
-	df = pd.DataFrame([list(x_dict.values())], columns=cols)
-	df['Age Group'] = df['Age Group'].astype('category')
-	
 	try:
-		prediction = pipeline.predict(df)
-		data_db = datax.model_dump()
-		data_db['prediction'] = int(prediction[0])
+		result = prediction_result(data_db, explain)
+		if writer is not None:
+			writer.submit(data_db)
+			return result
 		new_data = model.Data(**data_db)
-		db.add(new_data)
-		db.commit()
-		return {"pred": data_db['prediction']}
-	except SQLAlchemyError:
+		with metrics.DB_COMMIT.time('sync'):
+			db.add(new_data)
+			for stmt, params in summary.upsert_statements([data_db]):
+				db.execute(stmt, params)
+			db.commit()
+		result["id"] = new_data.id
+		return result
+	except Exception as e:
+		# La respuesta sigue siendo {"msg": "error"}, pero el fallo queda en el log y en /metrics
+		record_error('predict', e)
 		db.rollback()
+		metrics.ROLLBACKS.inc('predict')
+	return None
+
+
+async def apost_data(db, datax: model.FeatureSchema, explain=False):
+	# Igual que post_data pero con la AsyncSession de db.py (DB_ASYNC=1). La predicción (CPU) y el encolado
+	# en el write-behind (puede bloquear hasta put_timeout con la cola llena) van al threadpool; en el bucle
+	# de eventos solo se espera la E/S de la base de datos
+	data_db = datax.model_dump()
+
+	try:
+		result = await run_in_threadpool(prediction_result, data_db, explain)
+		if writer is not None:
+			await run_in_threadpool(writer.submit, data_db)
+			return result
+		new_data = model.Data(**data_db)
+		with metrics.DB_COMMIT.time('async'):
+			db.add(new_data)
+			for stmt, params in summary.upsert_statements([data_db]):
+				await db.execute(stmt, params)
+			await db.commit()
+		result["id"] = new_data.id
+		return result
+	except Exception as e:
+		record_error('predict', e)
+		await db.rollback()
+		metrics.ROLLBACKS.inc('predict')
+	return None
+
+
+def persist_rows(records):
+	# Una transacción para todo el lote; si falla, fila a fila para que una fila mala no tumbe al resto
+	with SessionLocal() as db:
+		try:
+			with metrics.DB_COMMIT.time('microbatch'):
+				rows = [model.Data(**record) for record in records]
+				db.add_all(rows)
+				for stmt, params in summary.upsert_statements(records):
+					db.execute(stmt, params)
+				db.flush()
+				# Los ids se leen antes del commit: después cada acceso recargaría la fila
+				ids = [row.id for row in rows]
+				db.commit()
+			return ids
+		except Exception as e:
+			record_error('predict', e)
+			db.rollback()
+			metrics.ROLLBACKS.inc('predict')
+	if len(records) == 1:
+		return [None]
+	return [persist_rows([record])[0] for record in records]
+
+
+def post_micro_batch(items):
+	"""[(data_db, explain)] -> [resultado de post_data o None], con una inferencia y un commit por lote."""
+	bundle = registry.get()
+	records = [data_db for data_db, _ in items]
+	try:
+		predictions = cached_predictions(cache, bundle, records)
+	except Exception as e:
+		record_error('predict', e)
+		return [None] * len(items)
+	if drift_monitor is not None:
+		drift_monitor.observe_many(records)
+
+	results = []
+	for (data_db, explain), (pred, _) in zip(items, predictions):
+		data_db['prediction'] = pred
+		metrics.PREDICTIONS.inc(str(pred))
+		result = {"pred": pred}
+		if explain and bundle.explainer is not None:
+			result["explanation"] = {"model_version": bundle.version, **bundle.explainer.explain(data_db)}
+		results.append(result)
+
+	if writer is not None:
+		writer.submit_many(records)
+		return results
+	for result, new_id in zip(results, persist_rows(records)):
+		result["id"] = new_id
+	# Una fila que no se pudo guardar responde {"msg": "error"}, como en post_data
+	return [result if result["id"] is not None else None for result in results]
+
+
+# MICRO_BATCH=1: /predict/ agrupa las peticiones concurrentes en lotes (ventana y tamaño máximos)
+if os.getenv('MICRO_BATCH', '0') == '1':
+	batcher = MicroBatcher(
+		post_micro_batch,
+		max_batch_size=int(os.getenv('MICRO_BATCH_MAX_SIZE', 64)),
+		max_wait=float(os.getenv('MICRO_BATCH_WINDOW_MS', 2)) / 1000,
+		workers=int(os.getenv('MICRO_BATCH_THREADS', 1)),
+	)
+else:
+	batcher = None
+
+
+def score_rows(classifier, x):
+	# Devuelve (predicciones, probabilidades, errores por fila)
+	try:
+		proba = classifier.predict_proba(x)
+		return classifier.classes_[proba.argmax(axis=1)], proba[:, 1], {}
 	except Exception:
+		pass
+
+	# Si falla el lote completo, puntuamos fila a fila para aislar las filas malas
+	preds, probs, errors = [], [], {}
+	for i in range(len(x)):
+		try:
+			proba = classifier.predict_proba(x[i:i + 1])
+			preds.append(classifier.classes_[proba[0].argmax()])
+			probs.append(proba[0, 1])
+		except Exception as e:
+			errors[i] = str(e)
+			preds.append(None)
+			probs.append(None)
+	return preds, probs, errors
+
+
+def post_batch(db: Session, batch: list[model.FeatureSchema]):
+	if not batch:
+		return {"predictions": [], "errors": {}, "persistence": "committed"}
+
+	bundle = registry.get()
+	records = [datax.model_dump() for datax in batch]
+	keys = [(bundle.version, canonical_key(r)) for r in records]
+	results = [cache.get(k) for k in keys]
+
+	# Solo se codifican y puntúan las filas que no estaban en caché
+	missing = [i for i, r in enumerate(results) if r is None]
+	errors = {}
+	if missing:
+		with metrics.FEATURE_BUILD.time('batch'):
+			x = bundle.features.encode_records([records[i] for i in missing])
+		with metrics.INFERENCE.time('batch'):
+			preds, probs, row_errors = score_rows(bundle.classifier, x)
+		for j, i in enumerate(missing):
+			if j in row_errors:
+				errors[i] = row_errors[j]
+				continue
+			results[i] = (int(preds[j]), float(probs[j]))
+			cache.put(keys[i], results[i])
+
+	predictions = []
+	rows = []
+	for i, data_db in enumerate(records):
+		if i in errors:
+			continue
+		data_db['prediction'] = results[i][0]
+		rows.append(data_db)
+		predictions.append({"pos": i, "prediction": results[i][0], "probability": results[i][1]})
+		metrics.PREDICTIONS.inc(str(results[i][0]))
+	if errors:
+		metrics.ERRORS.inc('batch', 'RowError', amount=len(errors))
+	if drift_monitor is not None:
+		drift_monitor.observe_many(rows)
+
+	# persistence: committed, queued (write-behind), dead_lettered (cola llena) o failed. Las filas ya están
+	# puntuadas: un fallo al guardarlas no debe ocultar las predicciones al cliente
+	if writer is not None:
+		queued = writer.submit_many(rows) if rows else True
+		return {"predictions": predictions, "errors": errors,
+				"persistence": "queued" if queued else "dead_lettered"}
+
+	try:
+		if rows:
+			with metrics.DB_COMMIT.time('batch'):
+				db.execute(insert(model.Data), rows)
+				for stmt, params in summary.upsert_statements(rows):
+					db.execute(stmt, params)
+				db.commit()
+	except SQLAlchemyError as e:
+		record_error('batch', e)
 		db.rollback()
-	return None
-	
-def get_all_data(db: Session):
-	pass
\ No newline at end of file
+		metrics.ROLLBACKS.inc('batch')
+		return {"predictions": predictions, "errors": errors, "persistence": "failed",
+				"persistence_error": type(e).__name__}
+	return {"predictions": predictions, "errors": errors, "persistence": "committed"}
+
+
+def data_columns(fields=None):
+	# Proyección: columnas pedidas de la tabla data, siempre con id (es el cursor)
+	table = model.Data.__table__
+	if not fields:
+		return list(table.c)
+	unknown = [f for f in fields if f not in table.c]
+	if unknown:
+		raise ValueError(f"Unknown fields: {unknown}")
+	return [table.c.id] + [table.c[f] for f in fields if f != 'id']
+
+
+def get_all_data(db: Session, after_id: int = 0, limit: int = 100, fields=None):
+	# Paginación por cursor (id > after_id): coste constante en cualquier página, sin OFFSET
+	columns = data_columns(fields)
+	rows = db.execute(
+		select(*columns).where(model.Data.id > after_id).order_by(model.Data.id).limit(limit)).mappings().all()
+	items = [dict(row) for row in rows]
+	next_after_id = items[-1]['id'] if len(items) == limit else None
+	return {"items": items, "next_after_id": next_after_id}
+
+
+def iter_data(db: Session, after_id: int = 0, fields=None, limit=None, chunk_size: int = 1000):
+	# Bloques de filas para exportaciones en streaming; cada bloque es una consulta por cursor
+	remaining = limit
+	while remaining is None or remaining > 0:
+		size = chunk_size if remaining is None else min(chunk_size, remaining)
+		page = get_all_data(db, after_id, size, fields)
+		if page['items']:
+			yield page['items']
+		if page['next_after_id'] is None:
+			break
+		after_id = page['next_after_id']
+		if remaining is not None:
+			remaining -= len(page['items'])
\ No newline at end of file
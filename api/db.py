@@ -1,9 +1,10 @@
 import dotenv
 import os
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 dotenv.load_dotenv()
 
@@ -13,9 +14,87 @@ HOST = os.getenv('DEV_HOST')
 PORT = os.getenv('DEV_PORT')
 DB = os.getenv('DEV_DATABASE')
 
-database_url = f"mysql+mysqlconnector://{USER}:{PASS}@{HOST}:{PORT}/{DB}"
+# DATABASE_URL tiene prioridad, p. ej. sqlite:///airlines.db para tests y benchmarks sin MySQL
+database_url = os.getenv('DATABASE_URL') or f"mysql+mysqlconnector://{USER}:{PASS}@{HOST}:{PORT}/{DB}"
 
-engine = create_engine(database_url)
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+
+# DB_ASYNC=1 añade un engine asíncrono (necesita aiomysql o aiosqlite instalados)
+USE_ASYNC = os.getenv('DB_ASYNC', '0') == '1'
+ASYNC_DRIVERS = {'mysql+mysqlconnector': 'mysql+aiomysql', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def engine_options(url):
+    if url.startswith('sqlite'):
+        options = {'connect_args': {'check_same_thread': False}}
+        if make_url(url).database in (None, '', ':memory:'):
+            # Una única conexión compartida; si no, cada conexión vería su propia base en memoria
+            options['poolclass'] = StaticPool
+        return options
+    return {
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': POOL_PRE_PING,
+    }
+
+
+def make_engine(url=database_url):
+    engine = create_engine(url, **engine_options(url))
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _sqlite_pragmas)
+    return engine
+
+
+def make_async_engine(url=database_url):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    driver, rest = url.split(':', 1)
+    url = ASYNC_DRIVERS.get(driver, driver) + ':' + rest
+    engine = create_async_engine(url, **engine_options(url))
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', _sqlite_pragmas)
+    return engine
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+if USE_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = make_async_engine()
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+else:
+    async_engine = None
+    AsyncSessionLocal = None
+
+Base = declarative_base()
+
+
+def init_db(bind=None):
+    # Creación explícita del esquema (al arrancar la API o con `python db.py`), no al importar
+    import model  # noqa: F401  registra las tablas en Base.metadata
+
+    Base.metadata.create_all(bind=bind or engine)
+
+
+if __name__ == '__main__':
+    # Importar el módulo por su nombre para compartir Base con model.py
+    import db
+
+    db.init_db()
+    print(f"Schema created on {db.engine.url.render_as_string(hide_password=True)}")
@@ -0,0 +1,298 @@
+"""Monitor de drift de las características frente a la distribución de entrenamiento.
+
+Offline, ``python drift.py dataset.csv`` guarda un histograma de referencia
+por campo de ``FeatureSchema``, calculado sobre las filas con las que se
+entrena el modelo (mismo split que ``train.py``):
+
+- Numéricos (edad, distancia, retrasos): bordes en los deciles de la
+  referencia, más la media y la desviación.
+- Categóricos y valoraciones: un contador por valor, más un bin "otro".
+
+Online, ``DriftMonitor.observe`` se llama en cada predicción. Busca el bin de
+cada campo (un ``bisect`` o un dict), incrementa un contador en el bucket de
+tiempo actual y actualiza la media y la varianza de los numéricos con
+Welford, también por bucket. Es O(1) por registro, sin consultas a la base de datos y con unos
+pocos microsegundos bajo un lock. Los buckets forman un anillo, de 60
+buckets de 60 s por defecto, así que la memoria no crece con el tráfico.
+
+``report(window)`` suma los buckets de la ventana pedida (los conteos se suman
+y los Welford se combinan con la fórmula de Chan) y compara cada campo con la
+referencia:
+
+- PSI, con suavizado para los bins vacíos. Por debajo de 0.1 es estable,
+  hasta 0.25 es moderado y por encima es significativo.
+- KS sobre los histogramas (máxima distancia entre CDFs) en numéricos y
+  valoraciones.
+- El desplazamiento de la media de la ventana en desviaciones de la referencia.
+
+Uso:
+    python drift.py path/to/airline_passenger_satisfaction.csv [--output ../drift_reference.json]
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+import numpy as np
+
+from encoder import CATEGORIES, COLUMN_TO_FIELD, FIELDS, NUMERIC_FIELDS, RATING_FIELDS
+
+DEFAULT_REFERENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'drift_reference.json')
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Suavizado de los bins vacíos en el PSI (evita log(0))
+EPSILON = 1e-4
+
+
+def build_reference(columns, source=None, n_bins=10):
+    """Campo -> secuencia de valores (p. ej. ``{f: df[c]}``) -> perfil de referencia serializable en JSON."""
+    fields = {}
+    rows = None
+    for field in FIELDS:
+        values = np.asarray(columns[field])
+        rows = len(values)
+        if field in NUMERIC_FIELDS:
+            values = values.astype(np.float64)
+            values = values[~np.isnan(values)]
+            inner = np.quantile(values, np.arange(1, n_bins) / n_bins)
+            # Los retrasos tienen muchos ceros: deciles repetidos se funden en un solo borde
+            edges = np.unique(inner).tolist()
+            counts = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+            fields[field] = {'type': 'numeric', 'edges': edges, 'counts': counts.tolist(),
+                             'mean': float(values.mean()), 'std': float(values.std())}
+        else:
+            observed, counts = np.unique(values.astype(str) if field in CATEGORIES else values.astype(int),
+                                         return_counts=True)
+            fields[field] = {'type': 'categorical', 'ordinal': field in RATING_FIELDS,
+                             'values': observed.tolist(), 'counts': counts.tolist() + [0]}
+    return {'created_at': datetime.now().isoformat(), 'source': source, 'rows': rows, 'fields': fields}
+
+
+def load_reference(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def psi(expected, actual):
+    """Population Stability Index entre dos vectores de conteos con los mismos bins."""
+    p = np.asarray(expected, dtype=np.float64)
+    q = np.asarray(actual, dtype=np.float64)
+    p = np.maximum(p / p.sum(), EPSILON)
+    q = np.maximum(q / q.sum(), EPSILON)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+def ks(expected, actual):
+    """Estadístico KS sobre histogramas: máxima distancia entre las CDFs por bin."""
+    p = np.cumsum(expected, dtype=np.float64)
+    q = np.cumsum(actual, dtype=np.float64)
+    return float(np.abs(q / q[-1] - p / p[-1]).max())
+
+
+def status(value, n, min_samples):
+    if n < min_samples:
+        return 'insufficient_data'
+    if value >= PSI_SIGNIFICANT:
+        return 'significant'
+    if value >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+def merge_moments(parts):
+    """Combina estados de Welford [n, media, M2] de trozos disjuntos (Chan et al.)."""
+    n, mean, m2 = 0, 0.0, 0.0
+    for n_b, mean_b, m2_b in parts:
+        if not n_b:
+            continue
+        total = n + n_b
+        delta = mean_b - mean
+        mean += delta * n_b / total
+        m2 += m2_b + delta * delta * n * n_b / total
+        n = total
+    return [n, mean, m2]
+
+
+class DriftMonitor:
+    def __init__(self, reference, bucket_seconds=60.0, buckets=60, min_samples=100):
+        self.reference = reference
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = buckets
+        self.min_samples = min_samples
+
+        # Todos los bins de todos los campos en un solo vector: campo -> (desplazamiento, tamaño)
+        self._layout = {}
+        self._numeric = []      # (campo, desplazamiento, bordes, índice Welford)
+        self._categorical = []  # (campo, desplazamiento, valor -> bin, bin "otro")
+        offset = 0
+        for field in FIELDS:
+            ref = reference['fields'][field]
+            size = len(ref['counts'])
+            if ref['type'] == 'numeric':
+                self._numeric.append((field, offset, ref['edges'], len(self._numeric)))
+            else:
+                lookup = {value: offset + i for i, value in enumerate(ref['values'])}
+                self._categorical.append((field, offset, lookup, offset + size - 1))
+            self._layout[field] = (offset, size)
+            offset += size
+        self.n_bins = offset
+
+        self._lock = threading.Lock()
+        self._counts = [[0] * self.n_bins for _ in range(self.n_buckets)]
+        self._epochs = [None] * self.n_buckets
+        self._totals = [0] * self.n_buckets
+        # Welford por bucket y campo numérico: [n, media, M2], para que las medias sean de la misma ventana que el PSI
+        self._moments = [self._empty_moments() for _ in range(self.n_buckets)]
+        self.observed = 0
+
+    def _empty_moments(self):
+        return [[0, 0.0, 0.0] for _ in self._numeric]
+
+    def _bucket(self, now):
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % self.n_buckets
+        if self._epochs[slot] != epoch:
+            # El bucket de hace n_buckets periodos se recicla para el periodo actual
+            self._counts[slot] = [0] * self.n_bins
+            self._totals[slot] = 0
+            self._moments[slot] = self._empty_moments()
+            self._epochs[slot] = epoch
+        return slot
+
+    def observe(self, record, now=None):
+        """Añade un registro (dict de FeatureSchema) a la ventana actual; O(número de campos)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            slot = self._bucket(now)
+            counts = self._counts[slot]
+            moments = self._moments[slot]
+            for field, offset, edges, w in self._numeric:
+                value = record[field]
+                if value is None:
+                    continue
+                counts[offset + bisect_right(edges, value)] += 1
+                stats = moments[w]
+                stats[0] += 1
+                delta = value - stats[1]
+                stats[1] += delta / stats[0]
+                stats[2] += delta * (value - stats[1])
+            for field, offset, lookup, other in self._categorical:
+                counts[lookup.get(record[field], other)] += 1
+            self._totals[slot] += 1
+            self.observed += 1
+
+    def observe_many(self, records, now=None):
+        now = time.time() if now is None else now
+        for record in records:
+            self.observe(record, now)
+
+    def window_counts(self, window=None, now=None):
+        """(conteos por bin, filas, [n, media, M2] por numérico) de los buckets de los últimos ``window``
+        segundos (por defecto, todos)."""
+        now = time.time() if now is None else now
+        current = int(now // self.bucket_seconds)
+        span = self.n_buckets if window is None else max(1, min(self.n_buckets, math.ceil(window / self.bucket_seconds)))
+        with self._lock:
+            slots = [s for s, epoch in enumerate(self._epochs) if epoch is not None and current - epoch < span]
+            counts = np.array([self._counts[s] for s in slots], dtype=np.int64).reshape(len(slots), self.n_bins)
+            rows = sum(self._totals[s] for s in slots)
+            buckets = [[list(stats) for stats in self._moments[s]] for s in slots]
+        return counts.sum(axis=0), rows, [merge_moments(b[w] for b in buckets) for w in range(len(self._numeric))]
+
+    def report(self, window=None, now=None):
+        counts, rows, moments = self.window_counts(window, now)
+        fields = {}
+        for field in FIELDS:
+            offset, size = self._layout[field]
+            ref = self.reference['fields'][field]
+            actual = counts[offset:offset + size]
+            n = int(actual.sum())
+            info = {'n': n}
+            if n:
+                score = psi(ref['counts'], actual)
+                info.update(psi=score, status=status(score, n, self.min_samples))
+                if ref['type'] == 'numeric' or ref.get('ordinal'):
+                    info['ks'] = ks(ref['counts'], actual)
+                if ref['type'] == 'categorical':
+                    info['other'] = int(actual[-1])
+            else:
+                info['status'] = 'insufficient_data'
+            fields[field] = info
+
+        for (field, _, _, w) in self._numeric:
+            n, mean, m2 = moments[w]
+            ref = self.reference['fields'][field]
+            if n:
+                std = math.sqrt(m2 / n)
+                fields[field].update(mean=mean, std=std, reference_mean=ref['mean'], reference_std=ref['std'],
+                                     mean_shift=(mean - ref['mean']) / ref['std'] if ref['std'] else None)
+
+        scored = {f: info['psi'] for f, info in fields.items() if info['status'] != 'insufficient_data'}
+        return {
+            'window_seconds': window if window is not None else self.bucket_seconds * self.n_buckets,
+            'rows': rows,
+            'observed_total': self.observed,
+            'reference': {'created_at': self.reference.get('created_at'), 'source': self.reference.get('source'),
+                          'rows': self.reference.get('rows')},
+            'max_psi': max(scored.values()) if scored else None,
+            'drifted': sorted(f for f, info in fields.items() if info['status'] in ('moderate', 'significant')),
+            'fields': fields,
+        }
+
+
+def load_monitor():
+    """Monitor configurado por entorno, o None si está desactivado o no hay referencia."""
+    if os.getenv('DRIFT_MONITOR', '1') != '1':
+        return None
+    path = os.getenv('DRIFT_REFERENCE', DEFAULT_REFERENCE_PATH)
+    if not os.path.exists(path):
+        return None
+    return DriftMonitor(
+        load_reference(path),
+        bucket_seconds=float(os.getenv('DRIFT_BUCKET_SECONDS', 60)),
+        buckets=int(os.getenv('DRIFT_BUCKETS', 60)),
+        min_samples=int(os.getenv('DRIFT_MIN_SAMPLES', 100)),
+    )
+
+
+def _records(frame):
+    columns = frame.rename(columns=COLUMN_TO_FIELD)[FIELDS]
+    return columns.astype(object).where(columns.notna(), None).to_dict('records')
+
+
+def main(argv=None):
+    import pandas as pd
+
+    from train import load_dataset, split_dataset
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('data', nargs='?', default=os.getenv('PATH_TO_DATA'), help='CSV del dataset (PATH_TO_DATA)')
+    parser.add_argument('--output', default=os.getenv('DRIFT_REFERENCE', DEFAULT_REFERENCE_PATH))
+    args = parser.parse_args(argv)
+    if not args.data:
+        parser.error('the dataset path is required (argument or PATH_TO_DATA)')
+
+    # Referencia: train + validación, lo que ve el modelo final de train.py; el test sirve de comprobación
+    splits = split_dataset(*load_dataset(args.data))
+    X_fit = pd.concat([splits['train'][0], splits['validation'][0]]).rename(columns=COLUMN_TO_FIELD)
+    reference = build_reference({f: X_fit[f].to_numpy() for f in FIELDS}, source=os.path.abspath(args.data))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(reference, f, indent=1)
+    print(f"reference with {reference['rows']} rows written to {args.output}")
+
+    monitor = DriftMonitor(reference)
+    records = _records(splits['test'][0])
+    start = time.perf_counter()
+    monitor.observe_many(records)
+    per_record = (time.perf_counter() - start) / len(records)
+    report = monitor.report()
+    print(f"observe: {per_record * 1e6:.1f} µs/record; report: max PSI on the test split "
+          f"{report['max_psi']:.4f} ({len(report['drifted'])} fields drifted)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""Codificador de características compartido por la API y el dashboard.
+
+Traduce un ``FeatureSchema`` (o un lote columna a columna) directamente a la
+matriz float que consume el GradientBoostingClassifier, sin construir un
+DataFrame por petición. Las tablas de búsqueda (grupos de edad, códigos de las
+categorías y de las valoraciones) se calculan una sola vez.
+
+Uso:
+    python encoder.py   # microbenchmark frente al camino DataFrame + Pipeline
+"""
+import numpy as np
+
+# Campos de FeatureSchema -> columnas con las que se entrenó el modelo
+FIELD_TO_COLUMN = {
+    'gender': 'Gender',
+    'customer': 'Customer Type',
+    'age': 'Age',
+    'type_travel': 'Type of Travel',
+    'class_flight': 'Class',
+    'distance': 'Flight Distance',
+    'wifi': 'Inflight wifi service',
+    'arrival_time': 'Departure/Arrival time convenient',
+    'online_booking': 'Ease of Online booking',
+    'gate_location': 'Gate location',
+    'food_drink': 'Food and drink',
+    'online_boarding': 'Online boarding',
+    'seat_confort': 'Seat comfort',
+    'entertainment': 'Inflight entertainment',
+    'on_board': 'On-board service',
+    'leg_room': 'Leg room service',
+    'baggage_handling': 'Baggage handling',
+    'checkin': 'Checkin service',
+    'inflight_serv': 'Inflight service',
+    'cleanliness': 'Cleanliness',
+    'departure_delay': 'Departure Delay in Minutes',
+    'arrival_dealy': 'Arrival Delay in Minutes',
+}
+COLUMN_TO_FIELD = {c: f for f, c in FIELD_TO_COLUMN.items()}
+
+FIELDS = list(FIELD_TO_COLUMN)
+COLUMNS = list(FIELD_TO_COLUMN.values()) + ['Age Group']
+
+NUMERIC_FIELDS = ['age', 'distance', 'departure_delay', 'arrival_dealy']
+CATEGORIES = {
+    'gender': ['Male', 'Female'],
+    'customer': ['Loyal Customer', 'disloyal Customer'],
+    'type_travel': ['Personal Travel', 'Business travel'],
+    'class_flight': ['Eco', 'Eco Plus', 'Business'],
+}
+RATING_FIELDS = [
+    'wifi', 'arrival_time', 'online_booking', 'gate_location', 'food_drink',
+    'online_boarding', 'seat_confort', 'entertainment', 'on_board', 'leg_room',
+    'baggage_handling', 'checkin', 'inflight_serv', 'cleanliness',
+]
+RATING_VALUES = list(range(1, 6))
+
+AGE_STEP = 5
+AGE_GROUPS = [f"{lo}-{lo + AGE_STEP}" for lo in range(0, 100, AGE_STEP)]
+
+
+def which_age(num):
+    if num is None or not 0 <= num < 100:
+        return None
+    return AGE_GROUPS[int(num) // AGE_STEP]
+
+
+def age_groups(ages):
+    """Versión vectorizada de ``which_age``; None fuera de [0, 100)."""
+    ages = np.asarray(ages, dtype=np.float64)
+    out = np.full(len(ages), None, dtype=object)
+    ok = (ages >= 0) & (ages < 100)
+    out[ok] = np.asarray(AGE_GROUPS, dtype=object)[(ages[ok] // AGE_STEP).astype(np.intp)]
+    return out
+
+
+class FeatureEncoder:
+    """Tablas del preprocesador ajustado (imputer, scaler y one-hot) en arrays planos."""
+
+    def __init__(self, pipeline):
+        preprocessor = pipeline.named_steps['preprocessor']
+        self.num_fields = []
+        num_stats = []
+        vocabs = []
+        blocks = []
+
+        for name, trans, columns in preprocessor.transformers_:
+            if trans == 'drop':
+                continue
+            unknown = [c for c in columns if c not in COLUMN_TO_FIELD]
+            if unknown:
+                raise ValueError(f"Transformer '{name}' uses unknown columns {unknown}")
+            steps = dict(trans.steps)
+            if 'scaler' in steps:
+                scaler = steps['scaler']
+                mean = scaler.mean_ if scaler.with_mean else np.zeros(len(columns))
+                scale = scaler.scale_ if scaler.with_std else np.ones(len(columns))
+                num_stats.append((steps['imputer'].statistics_, mean, scale))
+                self.num_fields.extend(COLUMN_TO_FIELD[c] for c in columns)
+                blocks.append(len(columns))
+            elif 'onehot' in steps:
+                onehot = steps['onehot']
+                if onehot.handle_unknown != 'ignore' or onehot.drop_idx_ is not None:
+                    raise ValueError("Only OneHotEncoder(handle_unknown='ignore') without drop is supported")
+                blocks.append(sum(len(cats) for cats in onehot.categories_))
+                vocabs.extend((COLUMN_TO_FIELD[c], list(cats)) for c, cats in zip(columns, onehot.categories_))
+            else:
+                raise ValueError(f"Unsupported transformer '{name}'")
+
+        # El scaler va primero en el ColumnTransformer; el one-hot le sigue en bloques contiguos
+        if not self.num_fields or blocks[0] != len(self.num_fields):
+            raise ValueError("Expected the numeric transformer before the categorical one")
+        self.num_median = np.concatenate([s[0] for s in num_stats]).astype(np.float64)
+        self.num_mean = np.concatenate([s[1] for s in num_stats]).astype(np.float64)
+        self.num_scale = np.concatenate([s[2] for s in num_stats]).astype(np.float64)
+
+        # Cada campo categórico o de valoración: valor -> columna absoluta en la salida
+        offset = len(self.num_fields)
+        self.cat_index = {}
+        self.rating_table = {}
+        for field, cats in vocabs:
+            self.cat_index[field] = {v: offset + i for i, v in enumerate(cats)}
+            if field in RATING_FIELDS:
+                table = np.full(max(int(v) for v in cats) + 1, -1, dtype=np.intp)
+                table[[int(v) for v in cats]] = offset + np.arange(len(cats))
+                self.rating_table[field] = table
+            offset += len(cats)
+        self.cat_fields = list(self.cat_index)
+        self.n_features = offset
+
+    def encode(self, record):
+        """Un registro (p. ej. ``FeatureSchema.model_dump()``) -> array (1, n_features)."""
+        out = np.zeros((1, self.n_features))
+        row = out[0]
+        for j, field in enumerate(self.num_fields):
+            v = record[field]
+            row[j] = ((self.num_median[j] if v is None or v != v else v) - self.num_mean[j]) / self.num_scale[j]
+        for field, lookup in self.cat_index.items():
+            col = lookup.get(record[field])
+            if col is not None:
+                row[col] = 1.0
+        return out
+
+    def encode_batch(self, columns):
+        """Lote columna a columna (campo -> secuencia) -> array C-contiguo (n, n_features)."""
+        n = len(columns[self.num_fields[0]])
+        out = np.zeros((n, self.n_features))
+
+        block = out[:, :len(self.num_fields)]
+        for j, field in enumerate(self.num_fields):
+            block[:, j] = np.asarray(columns[field], dtype=np.float64)
+        np.copyto(block, self.num_median, where=np.isnan(block))
+        block -= self.num_mean
+        block /= self.num_scale
+
+        rows = np.arange(n)
+        for field, lookup in self.cat_index.items():
+            if field in self.rating_table:
+                idx = self._rating_columns(field, columns[field])
+            else:
+                idx = np.fromiter((lookup.get(v, -1) for v in columns[field]), dtype=np.intp, count=n)
+            known = idx >= 0
+            out[rows[known], idx[known]] = 1.0
+        return out
+
+    def _rating_columns(self, field, values):
+        table = self.rating_table[field]
+        values = np.asarray(values, dtype=np.float64)
+        idx = np.full(len(values), -1, dtype=np.intp)
+        ok = (values >= 0) & (values < len(table)) & (values == np.floor(values))
+        idx[ok] = table[values[ok].astype(np.intp)]
+        return idx
+
+    def encode_records(self, records):
+        return self.encode_batch({f: [r[f] for r in records] for f in FIELDS})
+
+    def encode_frame(self, df):
+        """Un DataFrame con las columnas de entrenamiento (como en el notebook)."""
+        return self.encode_batch({f: df[c].to_numpy() for f, c in FIELD_TO_COLUMN.items()})
+
+
+def _bench():
+    import os
+    import timeit
+
+    import joblib
+    import pandas as pd
+
+    pipeline = joblib.load(os.getenv('MODEL_PATH', '../model_pipeline.pkl'))
+    clf = pipeline.steps[-1][1]
+    enc = FeatureEncoder(pipeline)
+
+    rng = np.random.default_rng(0)
+    record = {
+        'gender': 'Male', 'customer': 'Loyal Customer', 'age': 30, 'type_travel': 'Business travel',
+        'class_flight': 'Business', 'distance': 1000, 'departure_delay': 5, 'arrival_dealy': 0,
+        **{f: 3 for f in RATING_FIELDS},
+    }
+    records = [
+        {**record, 'age': int(a), 'distance': int(d), **{f: int(v) for f, v in zip(RATING_FIELDS, r)}}
+        for a, d, r in zip(rng.integers(7, 85, 1000), rng.integers(30, 5000, 1000),
+                           rng.integers(1, 6, (1000, len(RATING_FIELDS))))
+    ]
+
+    def dataframe_path(recs):
+        # Camino anterior de crud.post_data: DataFrame por petición + Pipeline completo
+        rows = [[*(r[f] for f in FIELDS), which_age(r['age'])] for r in recs]
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        df['Age Group'] = df['Age Group'].astype('category')
+        return pipeline.predict_proba(df)
+
+    assert np.allclose(dataframe_path(records), clf.predict_proba(enc.encode_records(records)))
+
+    cases = [
+        ('1 row, encode only', lambda: pipeline.named_steps['preprocessor'].transform(
+            pd.DataFrame([[*(record[f] for f in FIELDS), which_age(record['age'])]], columns=COLUMNS)),
+         lambda: enc.encode(record), 2000),
+        ('1 row, encode + predict', lambda: dataframe_path([record]),
+         lambda: clf.predict_proba(enc.encode(record)), 1000),
+        ('1000 rows, encode + predict', lambda: dataframe_path(records),
+         lambda: clf.predict_proba(enc.encode_records(records)), 20),
+    ]
+    print(f"{'case':<30}{'DataFrame':>14}{'encoder':>14}{'speedup':>10}")
+    for name, old, new, number in cases:
+        t_old = min(timeit.repeat(old, number=number, repeat=3)) / number
+        t_new = min(timeit.repeat(new, number=number, repeat=3)) / number
+        print(f"{name:<30}{t_old * 1e6:>12.1f}us{t_new * 1e6:>12.1f}us{t_old / t_new:>9.1f}x")
+
+
+if __name__ == '__main__':
+    _bench()
@@ -0,0 +1,166 @@
+"""Motor de inferencia compilado para el pipeline de model_pipeline.pkl.
+
+Convierte los árboles del GradientBoostingClassifier en arrays planos de NumPy
+una sola vez (el preprocesado lo compila ``encoder.FeatureEncoder``) y puntúa una
+o muchas filas recorriendo todos los árboles a la vez, sin pasar por el
+dispatch de pandas/sklearn en cada petición.
+
+Uso:
+    python engine.py [ruta_csv]   # comprueba la paridad con pipeline.predict_proba
+"""
+import os
+import sys
+
+import numpy as np
+from scipy.special import expit
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import GradientBoostingClassifier
+
+from encoder import COLUMNS, FIELD_TO_COLUMN, FeatureEncoder, age_groups
+
+
+def supports(clf):
+    """True si el clasificador se puede compilar (y explicar): un GradientBoostingClassifier binario."""
+    return isinstance(clf, GradientBoostingClassifier) and clf.n_trees_per_iteration_ == 1
+
+
+class CompiledForest:
+    """Sustituto del GradientBoostingClassifier ajustado sobre la matriz ya codificada."""
+
+    def __init__(self, clf):
+        self.classes_ = clf.classes_
+        self.n_features_in_ = clf.n_features_in_
+        self._compile_forest(clf)
+
+    def _compile_forest(self, clf):
+        if clf.n_trees_per_iteration_ != 1:
+            raise ValueError("Only binary classifiers are supported")
+        if clf.init_ != 'zero' and not isinstance(clf.init_, DummyClassifier):
+            raise ValueError("Only constant init estimators are supported")
+
+        trees = [est[0].tree_ for est in clf.estimators_]
+        n_trees = len(trees)
+        width = max(t.node_count for t in trees)
+
+        feature = np.zeros((n_trees, width), dtype=np.intp)
+        threshold = np.full((n_trees, width), np.inf)
+        left = np.tile(np.arange(width, dtype=np.intp), (n_trees, 1))
+        right = left.copy()
+        value = np.zeros((n_trees, width))
+        weight = np.zeros((n_trees, width))
+
+        for t, tree in enumerate(trees):
+            n = tree.node_count
+            split = tree.children_left != -1
+            # Las hojas apuntan a sí mismas, así todos los árboles avanzan el mismo número de pasos
+            feature[t, :n][split] = tree.feature[split]
+            threshold[t, :n][split] = tree.threshold[split]
+            left[t, :n][split] = tree.children_left[split]
+            right[t, :n][split] = tree.children_right[split]
+            value[t, :n] = tree.value[:, 0, 0]
+            weight[t, :n] = tree.weighted_n_node_samples
+
+        base = (np.arange(n_trees, dtype=np.intp) * width)[:, None]
+        self.roots = base[:, 0]
+        self.feature = feature.ravel()
+        self.threshold = threshold.ravel()
+        self.left = (left + base).ravel()
+        self.right = (right + base).ravel()
+        self.value = value.ravel() * clf.learning_rate
+        # Muestras de entrenamiento por nodo (las usa explain.py para los valores esperados)
+        self.weight = weight.ravel()
+        self.depth = max(t.max_depth for t in trees)
+
+        self.init_raw = float(clf._raw_predict_init(np.zeros((1, clf.n_features_in_)))[0, 0])
+        self.link_scale = 2.0 if clf.loss == 'exponential' else 1.0
+
+    def decision_function(self, Xt):
+        # Los árboles de sklearn comparan en float32
+        Xt = np.asarray(Xt, dtype=np.float32)
+        rows = np.arange(len(Xt))[:, None]
+        node = np.broadcast_to(self.roots, (len(Xt), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = Xt[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.init_raw + self.value[node].sum(axis=1)
+
+    def predict_proba(self, Xt):
+        proba = expit(self.link_scale * self.decision_function(Xt))
+        return np.column_stack([1.0 - proba, proba])
+
+    def predict(self, Xt):
+        return self.classes_[(self.decision_function(Xt) >= 0).astype(int)]
+
+
+class CompiledPipeline:
+    """Sustituto de ``pipeline`` con la misma interfaz predict/predict_proba sobre DataFrames."""
+
+    def __init__(self, pipeline):
+        self.encoder = FeatureEncoder(pipeline)
+        self.forest = CompiledForest(pipeline.steps[-1][1])
+        self.classes_ = self.forest.classes_
+        if self.encoder.n_features != self.forest.n_features_in_:
+            raise ValueError(
+                f"Encoder produces {self.encoder.n_features} features, model expects {self.forest.n_features_in_}")
+
+    def transform(self, X):
+        return self.encoder.encode_frame(X)
+
+    def decision_function(self, X):
+        return self.forest.decision_function(self.transform(X))
+
+    def predict_proba(self, X):
+        return self.forest.predict_proba(self.transform(X))
+
+    def predict(self, X):
+        return self.forest.predict(self.transform(X))
+
+
+def check_parity(pipeline, X, compiled=None):
+    """Máxima diferencia absoluta entre el motor compilado y ``pipeline.predict_proba``."""
+    compiled = compiled or CompiledPipeline(pipeline)
+    expected = pipeline.predict_proba(X)
+    got = compiled.predict_proba(X)
+    same_class = np.array_equal(pipeline.predict(X), compiled.predict(X))
+    return float(np.abs(expected - got).max()), same_class
+
+
+def load_holdout(path):
+    # Mismo preprocesado y split que el notebook (test_size=0.2, random_state=42)
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(path)
+    df['Arrival Delay in Minutes'] = df['Arrival Delay in Minutes'].fillna(df['Departure Delay in Minutes'])
+    df = df.drop(['Unnamed: 0', 'id'], axis=1, errors='ignore')
+    df['Age Group'] = pd.cut(df['Age'], bins=range(0, 101, 5), right=False)
+    features = df.drop('satisfaction', axis=1)
+    target = df['satisfaction']
+    _, X_test, _, _ = train_test_split(features, target, test_size=0.2, random_state=42)
+    return X_test
+
+
+def random_frame(encoder, n, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    data = {}
+    for field, median in zip(encoder.num_fields, encoder.num_median):
+        data[FIELD_TO_COLUMN[field]] = rng.exponential(max(median, 1.0), n).round()
+    for field, lookup in encoder.cat_index.items():
+        vocab = np.array(list(lookup), dtype=object)
+        data[FIELD_TO_COLUMN[field]] = vocab[rng.integers(0, len(vocab), n)]
+    data['Age Group'] = pd.Categorical(age_groups(data['Age']))
+    return pd.DataFrame(data)[COLUMNS]
+
+
+if __name__ == '__main__':
+    import joblib
+
+    pipeline = joblib.load(os.getenv('MODEL_PATH', '../model_pipeline.pkl'))
+    compiled = CompiledPipeline(pipeline)
+    path = sys.argv[1] if len(sys.argv) > 1 else os.getenv('PATH_TO_DATA')
+    X = load_holdout(path) if path else random_frame(compiled.encoder, 20000)
+    max_diff, same_class = check_parity(pipeline, X, compiled)
+    print(f"rows={len(X)} max|proba diff|={max_diff:.3e} same predictions={same_class}")
+    sys.exit(0 if max_diff < 1e-9 and same_class else 1)
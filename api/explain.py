@@ -0,0 +1,122 @@
+"""Explicaciones del GradientBoostingClassifier: importancias globales y contribuciones por fila.
+
+- Importancias globales: ``feature_importances_`` sumadas por campo original (las
+  columnas one-hot de una valoración cuentan como un solo campo). Se calculan una
+  vez por versión del modelo, al construir el ``Explainer`` del ``ModelBundle``.
+- Contribuciones por fila: atribución por caminos (Saabas). Cada nodo tiene su
+  valor esperado (media de las hojas ponderada por las muestras de entrenamiento);
+  al bajar de un nodo a su hijo, la diferencia se atribuye al campo de la división.
+  Se recorren todos los árboles y filas a la vez sobre los arrays de
+  ``engine.CompiledForest``. Por construcción
+  ``base_value + sum(contribuciones) == log-odds de la predicción``.
+
+Uso:
+    python explain.py   # comprueba la aditividad y mide la latencia por fila
+"""
+import os
+
+import numpy as np
+
+import engine
+from encoder import FIELDS, FeatureEncoder
+
+
+class Explainer:
+    def __init__(self, pipeline, features=None, forest=None):
+        clf = pipeline.steps[-1][1]
+        self.features = features or FeatureEncoder(pipeline)
+        self.forest = forest or engine.CompiledForest(clf)
+
+        # Columna de la matriz codificada -> índice del campo de FeatureSchema
+        field_index = {field: i for i, field in enumerate(FIELDS)}
+        self.column_field = np.empty(self.features.n_features, dtype=np.intp)
+        for j, field in enumerate(self.features.num_fields):
+            self.column_field[j] = field_index[field]
+        for field, lookup in self.features.cat_index.items():
+            self.column_field[list(lookup.values())] = field_index[field]
+
+        self.node_mean = self._node_means()
+        forest = self.forest
+        # Log-odds esperados sobre los datos de entrenamiento (punto de partida de la contribución)
+        self.base_value = forest.link_scale * (forest.init_raw + float(self.node_mean[forest.roots].sum()))
+
+        by_field = np.bincount(self.column_field, weights=clf.feature_importances_, minlength=len(FIELDS))
+        order = np.argsort(-by_field, kind='stable')
+        self.importances = {FIELDS[i]: float(by_field[i]) for i in order}
+
+    def _node_means(self):
+        # De abajo arriba, todos los nodos a la vez: tras ``depth`` pasadas cada nodo interno
+        # tiene la media ponderada de sus hojas (las hojas apuntan a sí mismas y no cambian)
+        forest = self.forest
+        split = forest.left != np.arange(len(forest.left))
+        left, right = forest.left[split], forest.right[split]
+        w_left, w_right = forest.weight[left], forest.weight[right]
+        total = w_left + w_right
+        mean = forest.value.copy()
+        for _ in range(forest.depth):
+            mean[split] = (w_left * mean[left] + w_right * mean[right]) / total
+        return mean
+
+    def contributions(self, Xt):
+        """Matriz codificada (n, n_features) -> contribuciones en log-odds (n, len(FIELDS))."""
+        forest = self.forest
+        Xt = np.asarray(Xt, dtype=np.float32)
+        n, n_fields = len(Xt), len(FIELDS)
+        rows = np.arange(n)[:, None]
+        offsets = rows * n_fields
+        node = np.broadcast_to(forest.roots, (n, len(forest.roots)))
+        out = np.zeros(n * n_fields)
+        for _ in range(forest.depth):
+            feature = forest.feature[node]
+            go_left = Xt[rows, feature] <= forest.threshold[node]
+            child = np.where(go_left, forest.left[node], forest.right[node])
+            # En las hojas child == node, así que su delta es 0 sea cual sea su "feature"
+            delta = self.node_mean[child] - self.node_mean[node]
+            out += np.bincount((offsets + self.column_field[feature]).ravel(), weights=delta.ravel(),
+                               minlength=n * n_fields)
+            node = child
+        return out.reshape(n, n_fields) * forest.link_scale
+
+    def explain(self, record):
+        """Un registro -> {"base_value", "contributions": campo -> log-odds}."""
+        contrib = self.contributions(self.features.encode(record))[0]
+        return {
+            "base_value": self.base_value,
+            "contributions": {field: float(c) for field, c in zip(FIELDS, contrib)},
+        }
+
+    def explain_records(self, records):
+        contrib = self.contributions(self.features.encode_records(records))
+        return [
+            {"base_value": self.base_value, "contributions": {field: float(c) for field, c in zip(FIELDS, row)}}
+            for row in contrib
+        ]
+
+
+def _bench():
+    import timeit
+
+    import joblib
+
+    pipeline = joblib.load(os.getenv('MODEL_PATH', '../model_pipeline.pkl'))
+    explainer = Explainer(pipeline)
+    X = explainer.features.encode_frame(engine.random_frame(explainer.features, 1000))
+
+    # Aditividad: base + suma de contribuciones == log-odds del modelo de sklearn
+    clf = pipeline.steps[-1][1]
+    logodds = explainer.forest.link_scale * clf.decision_function(X)
+    total = explainer.base_value + explainer.contributions(X).sum(axis=1)
+    print(f"max|base + sum(contrib) - log-odds| = {np.abs(total - logodds).max():.3e}")
+
+    record = dict(zip(FIELDS, engine.random_frame(explainer.features, 1).iloc[0][:len(FIELDS)]))
+    for name, fn, rows, number in [
+        ('1 row (encode + explain)', lambda: explainer.explain(record), 1, 2000),
+        ('1000 rows, matrix', lambda: explainer.contributions(X), 1000, 20),
+        ('predict_proba 1 row', lambda: clf.predict_proba(X[:1]), 1, 2000),
+    ]:
+        t = min(timeit.repeat(fn, number=number, repeat=3)) / number
+        print(f"{name:<28}{t * 1e6:>10.1f}us total{t / rows * 1e6:>10.1f}us/row")
+
+
+if __name__ == '__main__':
+    _bench()
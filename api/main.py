@@ -1,13 +1,86 @@
-from fastapi import FastAPI, Depends
+import csv
+import io
+import json
+import os
+from contextlib import asynccontextmanager
+
+from typing import Literal, Optional
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from db import engine, SessionLocal
+from db import AsyncSessionLocal, SessionLocal, engine, init_db
+import metrics
 import model
 import crud
+import summary
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # DB_CREATE_SCHEMA=0 cuando el esquema se gestiona aparte (`python db.py`)
+    if os.getenv('DB_CREATE_SCHEMA', '1') == '1':
+        init_db()
+        # data_summary nueva sobre una tabla data con filas: se calcula una vez
+        with SessionLocal() as db:
+            summary.backfill_if_empty(db)
+    # Cargar y calentar el modelo antes de aceptar peticiones
+    await run_in_threadpool(crud.registry.load)
+    crud.registry.start_watcher()
+    yield
+    crud.registry.stop_watcher()
+    # Terminar los micro-lotes en curso y vaciar la cola write-behind antes de salir
+    if crud.batcher is not None:
+        await crud.batcher.close()
+    if crud.writer is not None:
+        crud.writer.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+def pool_samples():
+    # QueuePool (MySQL, SQLite en fichero); StaticPool (SQLite en memoria) no expone contadores
+    pool = engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return []
+    return [(('checked_out',), pool.checkedout()), (('idle',), pool.checkedin()),
+            (('size',), pool.size()), (('overflow',), max(pool.overflow(), 0))]
 
-app = FastAPI()
 
-model.Base.metadata.create_all(bind=engine)
+def model_samples():
+    info = crud.registry.health()
+    if not info['ready']:
+        return []
+    return [((info['version'], info['engine']), 1)]
+
+
+metrics.Gauge('db_pool_connections', 'Database connection pool usage.', ('state',), callback=pool_samples)
+metrics.Gauge('model_info', 'Loaded model version (value is always 1).', ('version', 'engine'), callback=model_samples)
+metrics.Gauge('model_reloads', 'Hot reloads since startup.', callback=lambda: [((), crud.registry.reloads)])
+metrics.Gauge('prediction_cache_entries', 'Entries in the prediction cache.',
+              callback=lambda: [((), crud.cache.stats()['size'])])
+metrics.Gauge('write_behind_pending', 'Rows waiting in the write-behind queue.',
+              callback=lambda: [((), crud.writer.stats()['pending'])] if crud.writer is not None else [])
+metrics.Gauge('micro_batch_pending', 'Requests waiting for a /predict/ micro-batch.',
+              callback=lambda: [((), crud.batcher.stats()['pending'])] if crud.batcher is not None else [])
+
+
+def drift_samples():
+    # PSI por campo sobre toda la ventana retenida; solo los campos con muestras suficientes
+    if crud.drift_monitor is None:
+        return []
+    fields = crud.drift_monitor.report()['fields']
+    return [((field,), info['psi']) for field, info in fields.items() if info['status'] != 'insufficient_data']
+
+
+metrics.Gauge('feature_drift_psi', 'Population stability index of each feature against the training reference.',
+              ('field',), callback=drift_samples)
 
 def get_db():
     db = SessionLocal()
@@ -16,11 +89,195 @@ def get_db():
     finally:
         db.close()
 
-@app.post("/predict/")
-def predict(data: model.FeatureSchema, db: Session = Depends(get_db)):
-    result = crud.post_data(db, data)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def prediction_response(data, result):
     if result:
         # Suponiendo que 'result' contiene una predicción de si el cliente estará satisfecho
-        return {"msg": "ok", "data": data, "prediction": result['pred']}
+        # 'id' es la fila de la tabla data (None si la escritura es diferida con WRITE_BEHIND=1)
+        response = {"msg": "ok", "data": data, "prediction": result['pred'], "id": result.get('id')}
+        # Con ?explain=true: base_value, contributions (log-odds por campo) y model_version
+        if 'explanation' in result:
+            response.update(result['explanation'])
+        return response
     else:
         return {"msg": "error"}
+
+
+if crud.batcher is not None:
+    # MICRO_BATCH=1: la petición espera su fila dentro de un lote (inferencia y commit en el pool del batcher)
+    @app.post("/predict/")
+    async def predict(data: model.FeatureSchema, explain: bool = False):
+        return prediction_response(data, await crud.batcher.submit((data.model_dump(), explain)))
+elif AsyncSessionLocal is not None:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    @app.post("/predict/")
+    async def predict(data: model.FeatureSchema, explain: bool = False, db: AsyncSession = Depends(get_async_db)):
+        return prediction_response(data, await crud.apost_data(db, data, explain))
+else:
+    @app.post("/predict/")
+    def predict(data: model.FeatureSchema, explain: bool = False, db: Session = Depends(get_db)):
+        return prediction_response(data, crud.post_data(db, data, explain))
+
+
+@app.get("/health")
+def health(response: Response):
+    model_info = crud.registry.health()
+    if not model_info['ready']:
+        response.status_code = 503
+    return {"status": "ok" if model_info['ready'] else "loading", "model": model_info}
+
+
+@app.get("/explain/importances")
+def explain_importances():
+    # Importancias globales por campo, calculadas una vez por versión del modelo (vacías si no es explicable)
+    bundle = crud.registry.get()
+    importances = bundle.explainer.importances if bundle.explainer is not None else {}
+    return {"model_version": bundle.version, "importances": importances}
+
+
+def parse_fields(fields):
+    return [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+
+def stream_data(after_id, fields, limit):
+    # Sesión propia: la de get_db se cierra antes de que se envíe el cuerpo en streaming
+    with SessionLocal() as db:
+        yield from crud.iter_data(db, after_id, fields, limit)
+
+
+@app.get("/data/")
+def read_data(
+    after_id: int = 0,
+    limit: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None,
+    format: Literal['json', 'ndjson', 'csv'] = 'json',
+    db: Session = Depends(get_db),
+):
+    """Filas de la tabla data por cursor (``after_id``). ``fields`` proyecta columnas separadas por comas;
+    ``format=ndjson|csv`` exporta en streaming desde ``after_id`` hasta ``limit`` filas (o hasta el final)."""
+    fields = parse_fields(fields)
+    try:
+        columns = [c.name for c in crud.data_columns(fields)]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == 'json':
+        return crud.get_all_data(db, after_id, min(limit or 100, 1000), fields)
+
+    chunks = stream_data(after_id, fields, limit)
+    if format == 'ndjson':
+        body = (''.join(json.dumps(jsonable_encoder(row)) + '\n' for row in chunk) for chunk in chunks)
+        return StreamingResponse(body, media_type='application/x-ndjson')
+
+    def csv_body():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        for chunk in chunks:
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    return StreamingResponse(csv_body(), media_type='text/csv',
+                             headers={'Content-Disposition': 'attachment; filename="data.csv"'})
+
+
+@app.get("/data/summary")
+def data_summary(db: Session = Depends(get_db)):
+    # Tasas de satisfacción por clase, tipo de cliente, tipo de viaje y grupo de edad (tabla data_summary)
+    return summary.rates(db)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return crud.cache.stats()
+
+
+@app.get("/writer/stats")
+def writer_stats():
+    if crud.writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **crud.writer.stats()}
+
+
+@app.get("/batcher/stats")
+def batcher_stats():
+    if crud.batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **crud.batcher.stats()}
+
+
+@app.get("/drift")
+def drift(window: Optional[float] = Query(None, gt=0, description="Seconds; defaults to the whole retained window")):
+    # PSI/KS de cada campo en la ventana frente al histograma de referencia (drift.py)
+    if crud.drift_monitor is None:
+        return {"enabled": False}
+    return {"enabled": True, **crud.drift_monitor.report(window)}
+
+
+def parse_batch(body: bytes, content_type: str):
+    # Acepta un array JSON o NDJSON (un objeto por línea)
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        items = []
+        for line in body.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(e)
+        return items
+
+    try:
+        items = json.loads(body)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    return items
+
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request, db: Session = Depends(get_db)):
+    items = parse_batch(await request.body(), request.headers.get('content-type', ''))
+
+    valid, positions, errors = [], [], []
+    for i, item in enumerate(items):
+        if isinstance(item, Exception):
+            errors.append({"index": i, "error": str(item)})
+            continue
+        try:
+            valid.append(model.FeatureSchema.model_validate(item))
+            positions.append(i)
+        except ValidationError as e:
+            errors.append({"index": i, "error": e.errors(include_url=False, include_context=False)})
+
+    result = await run_in_threadpool(crud.post_batch, db, valid)
+
+    predictions = [
+        {"index": positions[p['pos']], "prediction": p['prediction'], "probability": p['probability']}
+        for p in result['predictions']
+    ]
+    for pos, err in result['errors'].items():
+        errors.append({"index": positions[pos], "error": err})
+    errors.sort(key=lambda e: e['index'])
+
+    response = {"msg": "ok", "total": len(items), "predictions": predictions, "errors": errors,
+                "persistence": result['persistence']}
+    if 'persistence_error' in result:
+        response['persistence_error'] = result['persistence_error']
+    return response
@@ -0,0 +1,184 @@
+"""Métricas de la API en formato de texto de Prometheus (``GET /metrics``).
+
+Implementación mínima sin dependencias: contadores, gauges e histogramas con
+etiquetas, protegidos por un lock por métrica. Observar un valor es una búsqueda
+binaria en los buckets y dos sumas, así que se puede llamar en cada petición.
+Los gauges que dependen de otros objetos (pool de la base de datos, versión del
+modelo) se calculan al servir ``/metrics`` mediante una función.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+# Buckets en segundos: desde 100 µs (codificar una fila) hasta 10 s (lotes grandes)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def samples(self):
+        """[(sufijo, valores de etiquetas, etiquetas extra, valor)]"""
+        with self._lock:
+            return [('', labels, (), value) for labels, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_labels(self.labelnames, labels, extra)} {_number(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        # callback() -> [(valores de etiquetas, valor)], evaluado en cada scrape
+        self.callback = callback
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        return [('', tuple(labels), (), value) for labels, value in self.callback()]
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [conteos por bucket (el último es +Inf), suma]
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        out = []
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                out.append(('_bucket', labels, (f'le="{_number(bound)}"',), cumulative))
+            out.append(('_sum', labels, (), total))
+            out.append(('_count', labels, (), cumulative))
+        return out
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Middleware ASGI puro (sin BaseHTTPMiddleware) que mide la latencia de cada petición por ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # La plantilla de la ruta (p. ej. /predict/batch), no la URL, para acotar las series
+            route = scope.get('route')
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope['method'],
+                                    getattr(route, 'path', 'unmatched'), str(status))
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route.', ('method', 'route', 'status'))
+FEATURE_BUILD = Histogram(
+    'prediction_feature_build_seconds', 'Time to encode records into the model matrix.', ('mode',))
+INFERENCE = Histogram(
+    'prediction_inference_seconds', 'Time spent in predict_proba.', ('mode',))
+DB_COMMIT = Histogram(
+    'db_commit_seconds', 'Time to insert and commit prediction rows.', ('mode',))
+PREDICTIONS = Counter(
+    'predictions_total', 'Predictions served by predicted class.', ('class',))
+ERRORS = Counter(
+    'prediction_errors_total', 'Errors while predicting or persisting, by exception type.', ('operation', 'type'))
+MICRO_BATCH_SIZE = Histogram(
+    'prediction_micro_batch_size', 'Rows scored per /predict/ micro-batch.',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+ROLLBACKS = Counter(
+    'db_rollbacks_total', 'Database transactions rolled back.', ('operation',))
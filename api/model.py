@@ -33,6 +33,18 @@ class Data(Base):
 	prediction: Mapped[str] = mapped_column(String(50))
 
 
+class DataSummary(Base):
+	# Agregados de satisfacción por segmento; se actualizan en la misma transacción que cada inserción en data
+	__tablename__ = 'data_summary'
+
+	class_flight: Mapped[str] = mapped_column(String(50), primary_key=True)
+	customer: Mapped[str] = mapped_column(String(50), primary_key=True)
+	type_travel: Mapped[str] = mapped_column(String(50), primary_key=True)
+	age_group: Mapped[str] = mapped_column(String(10), primary_key=True)
+	total: Mapped[int] = mapped_column(Integer, default=0)
+	satisfied: Mapped[int] = mapped_column(Integer, default=0)
+
+
 # Schema
 class FeatureSchema(BaseModel):
 	gender: str
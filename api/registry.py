@@ -0,0 +1,195 @@
+"""Registro del modelo: carga perezosa, warm-up y recarga en caliente.
+
+El artefacto se carga una sola vez desde MODEL_PATH (por defecto
+model_pipeline.pkl en la raíz del repo, independiente del cwd). Un hilo vigila
+el fichero y, si cambia su checksum, carga y calienta la nueva versión antes de
+sustituir la referencia. Cada petición toma ``registry.get()`` una vez, así que
+las que están en vuelo terminan con la versión con la que empezaron.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+import engine
+from encoder import CATEGORIES, RATING_FIELDS, FeatureEncoder
+from explain import Explainer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model_pipeline.pkl')
+
+
+def file_checksum(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def warmup_records():
+    # Combina todas las categorías con valoraciones extremas para recorrer ramas distintas
+    records = []
+    for i, rating in enumerate([1, 3, 5]):
+        record = {field: values[i % len(values)] for field, values in CATEGORIES.items()}
+        record.update({field: rating for field in RATING_FIELDS})
+        record.update(age=20 + 20 * i, distance=500 * (i + 1), departure_delay=10 * i, arrival_dealy=10 * i)
+        records.append(record)
+    return records
+
+
+class ModelBundle:
+    """Todo lo que necesita una predicción, cargado a la vez y nunca modificado."""
+
+    def __init__(self, path, inference_engine='sklearn'):
+        self.path = path
+        # Una sola lectura: el checksum (la versión) y el modelo cargado salen de los mismos bytes aunque
+        # el fichero se sustituya entretanto; fstat sobre el mismo descriptor da la marca de ese contenido
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        self.stat = (stat.st_mtime_ns, stat.st_size)
+        self.mtime = stat.st_mtime
+        self.checksum = hashlib.sha256(data).hexdigest()
+        self.pipeline = joblib.load(io.BytesIO(data))
+        del data
+        self.features = FeatureEncoder(self.pipeline)
+        clf = self.pipeline.steps[-1][1]
+        # El motor compilado y las explicaciones solo existen para GradientBoostingClassifier;
+        # otros modelos de train.py (HistGradientBoosting, XGBoost, CatBoost...) se sirven con sklearn
+        compilable = engine.supports(clf)
+        if inference_engine == 'compiled' and not compilable:
+            logger.warning("%s cannot be compiled, serving it with sklearn", type(clf).__name__)
+            inference_engine = 'sklearn'
+        if inference_engine == 'compiled':
+            self.classifier = engine.CompiledForest(clf)
+        else:
+            self.classifier = clf
+        # Importancias globales calculadas una vez por versión; comparte el bosque compilado si lo hay
+        self.explainer = None
+        if compilable:
+            self.explainer = Explainer(
+                self.pipeline, self.features,
+                self.classifier if isinstance(self.classifier, engine.CompiledForest) else None)
+        self.inference_engine = inference_engine
+        self.version = self.checksum[:12]
+        self.loaded_at = datetime.now().isoformat()
+
+    def warmup(self):
+        records = warmup_records()
+        start = time.perf_counter()
+        for record in records:
+            self.classifier.predict_proba(self.features.encode(record))
+        self.classifier.predict_proba(self.features.encode_records(records))
+        if self.explainer is not None:
+            self.explainer.explain(records[0])
+        self.warmup_seconds = time.perf_counter() - start
+
+
+class ModelRegistry:
+    def __init__(self, path=None, inference_engine=None, reload_interval=None):
+        self.path = os.path.abspath(path or os.getenv('MODEL_PATH', DEFAULT_MODEL_PATH))
+        self.inference_engine = inference_engine or os.getenv('INFERENCE_ENGINE', 'sklearn')
+        self.reload_interval = float(
+            reload_interval if reload_interval is not None else os.getenv('MODEL_RELOAD_INTERVAL', 5))
+        self._current = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._stat = None
+        self.reloads = 0
+        self.last_error = None
+
+    @property
+    def ready(self):
+        return self._current is not None
+
+    @property
+    def version(self):
+        current = self._current
+        return current.version if current else None
+
+    def get(self):
+        current = self._current
+        if current is None:
+            current = self.load()
+        return current
+
+    def load(self):
+        with self._lock:
+            stat = os.stat(self.path)
+            if self._current is not None and self._current.checksum == file_checksum(self.path):
+                self._stat = (stat.st_mtime_ns, stat.st_size)
+                return self._current
+            bundle = ModelBundle(self.path, self.inference_engine)
+            bundle.warmup()
+            # Sustitución atómica: una sola asignación de referencia
+            previous, self._current = self._current, bundle
+            # La marca del contenido cargado: si el fichero cambió tras leerlo, el watcher lo recargará
+            self._stat = bundle.stat
+            if previous is not None:
+                self.reloads += 1
+                logger.info("model reloaded: %s -> %s", previous.version, bundle.version)
+            return bundle
+
+    def check(self):
+        """Recarga si el fichero ha cambiado; si la nueva versión falla, se mantiene la anterior."""
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            return
+        if (stat.st_mtime_ns, stat.st_size) == self._stat:
+            return
+        try:
+            self.load()
+            self.last_error = None
+        except Exception as e:
+            # No reintentar hasta que el fichero vuelva a cambiar
+            self._stat = (stat.st_mtime_ns, stat.st_size)
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.exception("model reload failed, keeping version %s", self.version)
+
+    def start_watcher(self):
+        if self.reload_interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            self.check()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def health(self):
+        current = self._current
+        info = {
+            "ready": current is not None,
+            "path": self.path,
+            "engine": self.inference_engine,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
+        if current is not None:
+            info.update(
+                version=current.version,
+                model=type(current.pipeline.steps[-1][1]).__name__,
+                serving_engine=current.inference_engine,
+                explainable=current.explainer is not None,
+                loaded_at=current.loaded_at,
+                model_mtime=datetime.fromtimestamp(current.mtime).isoformat(),
+                warmup_seconds=current.warmup_seconds,
+            )
+        return info
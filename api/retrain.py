@@ -0,0 +1,364 @@
+"""Reentrenamiento incremental con las predicciones registradas y el feedback.
+
+Cada ejecución lee solo lo nuevo desde el último checkpoint:
+
+1. Las entradas de ``feedback.db`` con id mayor que el del checkpoint, por
+   bloques (keyset por id). Cada una apunta con ``prediction_id`` a la fila de
+   la tabla ``data`` que valora. Las que no tienen ``prediction_id`` se
+   descartan.
+2. Esas filas de ``data``, leídas por clave primaria. La etiqueta es la
+   predicción registrada si el feedback es "correct" y la contraria si es
+   "incorrect". Si una fila aún no está en ``data`` (write-behind), su
+   feedback queda pendiente para la siguiente ejecución.
+
+El modelo se actualiza sin ajustarlo desde cero. El preprocesado queda
+congelado (las columnas codificadas no cambian) y el clasificador se entrena
+con las filas nuevas más una muestra de reservorio acotada del histórico
+etiquetado:
+
+- ``warm_start`` añade ``--stages`` etapas de boosting (o árboles, o
+  iteraciones) sobre ese conjunto. Vale para GradientBoosting,
+  HistGradientBoosting y RandomForest.
+- Si el modelo supera ``--max-stages``, o no admite warm start, se reajusta
+  con el tamaño original sobre el reservorio más las filas nuevas.
+
+El reservorio empieza con una muestra de las filas de entrenamiento del CSV
+(``--data``, la primera vez) y se actualiza con el algoritmo R. Así el coste de
+cada ejecución depende de las filas nuevas y del tamaño del reservorio, no del
+histórico.
+
+El resultado se valida contra un holdout congelado: el test del notebook,
+guardado la primera vez. Si la métrica no cae más de ``--max-drop`` respecto al
+modelo actual, se guarda como artefacto versionado (mismo formato que
+``train.py``) y, con ``--publish``, se copia a MODEL_PATH para que la API lo
+recargue. El checkpoint avanza aunque el modelo se rechace: las filas ya están
+en el reservorio y cuentan en la siguiente ejecución.
+
+Uso:
+    python retrain.py --data path/to/airline_passenger_satisfaction.csv   # primera vez: holdout y reservorio
+    python retrain.py [--stages 10] [--min-rows 50] [--publish]
+"""
+import argparse
+import copy
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sqlalchemy import select
+
+import model
+from db import SessionLocal
+from encoder import COLUMNS, FIELDS
+from registry import DEFAULT_MODEL_PATH, file_checksum
+from score import prepare
+from train import DEFAULT_OUTPUT_DIR, METRICS, library_versions, load_dataset, publish, scores, split_dataset, \
+    write_artifact
+
+DEFAULT_STATE_DIR = os.path.join(DEFAULT_OUTPUT_DIR, 'retrain')
+DEFAULT_FEEDBACK_DB = os.path.join(os.path.dirname(DEFAULT_MODEL_PATH), 'feedback.db')
+# Parámetro que cuenta etapas/árboles en los clasificadores que admiten warm_start
+STAGE_PARAMS = {
+    'GradientBoostingClassifier': 'n_estimators',
+    'HistGradientBoostingClassifier': 'max_iter',
+    'RandomForestClassifier': 'n_estimators',
+}
+# Feedback sin fila en data que se sigue reintentando como mucho
+MAX_PENDING = 10000
+
+
+class RetrainState:
+    """Checkpoint (state.json), reservorio y holdout congelado en ``state_dir``."""
+
+    def __init__(self, state_dir):
+        self.dir = state_dir
+        self.path = os.path.join(state_dir, 'state.json')
+        self.feedback_after_id = 0
+        self.pending = []
+        self.reservoir_seen = 0
+        self.base_stages = None
+        self.runs = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.__dict__.update(json.load(f))
+
+    def save(self):
+        os.makedirs(self.dir, exist_ok=True)
+        data = {k: v for k, v in self.__dict__.items() if k not in ('dir', 'path')}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, default=str)
+        os.replace(tmp, self.path)
+
+    def _file(self, name):
+        return os.path.join(self.dir, name)
+
+    def load_frame(self, name):
+        path = self._file(name)
+        return joblib.load(path) if os.path.exists(path) else None
+
+    def save_frame(self, name, frame):
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self._file(name) + '.tmp'
+        joblib.dump(frame, tmp)
+        os.replace(tmp, self._file(name))
+
+
+class Reservoir:
+    """Muestra uniforme acotada (algoritmo R) de las filas etiquetadas vistas hasta ahora."""
+
+    def __init__(self, capacity, X=None, y=None, seen=0, seed=0):
+        self.capacity = capacity
+        self.X = X if X is not None else pd.DataFrame(columns=COLUMNS)
+        self.y = np.asarray(y if y is not None else [], dtype=int)
+        self.seen = seen
+        self.rng = np.random.default_rng(seed + seen)
+
+    def __len__(self):
+        return len(self.y)
+
+    def add(self, X, y):
+        y = np.asarray(y, dtype=int)
+        room = max(0, min(self.capacity - len(self), len(y)))
+        if room:
+            head = X.iloc[:room].reset_index(drop=True)
+            self.X = pd.concat([self.X, head], ignore_index=True) if len(self) else head
+            self.y = np.concatenate([self.y, y[:room]])
+        # Resto: la fila i-ésima vista entra con probabilidad capacity / i, sustituyendo a una al azar
+        seen = self.seen + room + np.arange(1, len(y) - room + 1)
+        slots = (self.rng.random(len(seen)) * seen).astype(np.int64)
+        chosen = np.flatnonzero(slots < self.capacity)
+        if len(chosen):
+            # Si dos filas caen en el mismo hueco gana la última, como en el algoritmo secuencial
+            _, last = np.unique(slots[chosen][::-1], return_index=True)
+            chosen = chosen[::-1][last]
+            kept = np.ones(len(self), dtype=bool)
+            kept[slots[chosen]] = False
+            rows = chosen + room
+            self.X = pd.concat([self.X[kept], X.iloc[rows]], ignore_index=True)
+            self.y = np.concatenate([self.y[kept], y[rows]])
+        self.seen += len(y)
+
+
+def read_feedback(path, after_id, chunk_size=1000):
+    """Entradas de feedback con id > after_id, en orden de id y por bloques (solo lectura)."""
+    if not os.path.exists(path):
+        return
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        while True:
+            rows = conn.execute(
+                "SELECT id, prediction_id, feedback FROM feedback WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, chunk_size)).fetchall()
+            if not rows:
+                break
+            yield from rows
+            after_id = rows[-1][0]
+    finally:
+        conn.close()
+
+
+def fetch_rows(ids, chunk_size=500):
+    """id -> registro de la tabla data, por clave primaria."""
+    columns = [model.Data.id, model.Data.prediction] + [getattr(model.Data, f) for f in FIELDS]
+    rows = {}
+    ids = sorted(ids)
+    with SessionLocal() as db:
+        for i in range(0, len(ids), chunk_size):
+            for row in db.execute(select(*columns).where(model.Data.id.in_(ids[i:i + chunk_size]))).mappings():
+                rows[row['id']] = dict(row)
+    return rows
+
+
+def collect(state, feedback_path, chunk_size=1000):
+    """Filas nuevas etiquetadas -> (X, y, resumen); no modifica el checkpoint."""
+    labels = {}
+    last_id = state.feedback_after_id
+    read = skipped = 0
+    for feedback_id, prediction_id, value in read_feedback(feedback_path, state.feedback_after_id, chunk_size):
+        read += 1
+        last_id = feedback_id
+        if prediction_id is None or value not in ('correct', 'incorrect'):
+            skipped += 1
+            continue
+        # Si una predicción se valora varias veces, cuenta la última
+        labels[prediction_id] = value
+    for prediction_id, value in state.pending:
+        labels.setdefault(prediction_id, value)
+
+    rows = fetch_rows(labels) if labels else {}
+    records, y = [], []
+    for prediction_id, value in labels.items():
+        row = rows.get(prediction_id)
+        if row is None or row['prediction'] is None:
+            continue
+        predicted = int(row['prediction'])
+        records.append({f: row[f] for f in FIELDS})
+        y.append(predicted if value == 'correct' else 1 - predicted)
+    pending = [[i, v] for i, v in labels.items() if i not in rows][-MAX_PENDING:]
+
+    X = prepare(pd.DataFrame(records, columns=FIELDS))[COLUMNS] if records else pd.DataFrame(columns=COLUMNS)
+    summary = {'feedback_read': read, 'feedback_skipped': skipped, 'labeled_rows': len(records),
+               'pending': len(pending), 'feedback_after_id': last_id}
+    return X, np.asarray(y, dtype=int), summary, pending
+
+
+def update(pipeline, X, y, stages, max_stages, base_stages):
+    """Copia del pipeline con el clasificador actualizado; el preprocesado no se reajusta."""
+    pipeline = copy.deepcopy(pipeline)
+    name, clf = pipeline.steps[-1]
+    Xt = pipeline[:-1].transform(X)
+    param = STAGE_PARAMS.get(type(clf).__name__)
+    current = clf.get_params()[param] if param else None
+    if param and current + stages <= max_stages:
+        clf.set_params(warm_start=True, **{param: current + stages})
+        clf.fit(Xt, y)
+        clf.set_params(warm_start=False)
+        return pipeline, {'strategy': 'warm_start', 'stages_before': current, 'stages_after': current + stages}
+    refit = clone(clf)
+    if param:
+        refit.set_params(**{param: base_stages})
+    refit.fit(Xt, y)
+    pipeline.steps[-1] = (name, refit)
+    return pipeline, {'strategy': 'refit', 'stages_before': current, 'stages_after': base_stages if param else None}
+
+
+def initialize(state, data_path, reservoir_size, seed):
+    """Primera ejecución: holdout congelado (test del notebook) y reservorio con el resto del CSV."""
+    splits = split_dataset(*load_dataset(data_path), seed=seed)
+    X_test, y_test = splits['test']
+    state.save_frame('holdout.pkl', (X_test.reset_index(drop=True), y_test.to_numpy()))
+    X_fit = pd.concat([splits['train'][0], splits['validation'][0]]).reset_index(drop=True)
+    y_fit = np.concatenate([splits['train'][1].to_numpy(), splits['validation'][1].to_numpy()])
+    order = np.random.default_rng(seed).permutation(len(y_fit))
+    reservoir = Reservoir(reservoir_size, seed=seed)
+    reservoir.add(X_fit.iloc[order], y_fit[order])
+    state.reservoir_seen = reservoir.seen
+    state.holdout = {'path': os.path.abspath(data_path), 'sha256': file_checksum(data_path), 'rows': len(y_test)}
+    return reservoir
+
+
+def retrain(model_path, feedback_path=DEFAULT_FEEDBACK_DB, state_dir=DEFAULT_STATE_DIR, output_dir=DEFAULT_OUTPUT_DIR,
+            data_path=None, stages=10, max_stages=None, min_rows=50, reservoir_size=20000, metric='accuracy',
+            max_drop=0.002, seed=0):
+    """Una ejecución; devuelve (ruta del artefacto o None, resumen de la ejecución)."""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r} (expected one of {METRICS})")
+    start = time.perf_counter()
+    state = RetrainState(state_dir)
+    holdout = state.load_frame('holdout.pkl')
+    saved = state.load_frame('reservoir.pkl')
+    if holdout is None:
+        if data_path is None:
+            raise RuntimeError("No frozen holdout yet: run once with --data to create it")
+        reservoir = initialize(state, data_path, reservoir_size, seed)
+        holdout = state.load_frame('holdout.pkl')
+    else:
+        reservoir = Reservoir(reservoir_size, *(saved or (None, None)), seen=state.reservoir_seen, seed=seed)
+
+    X_new, y_new, summary, pending = collect(state, feedback_path)
+    run = {'started_at': datetime.now().isoformat(), **summary, 'reservoir_rows': len(reservoir)}
+    if len(y_new) < min_rows:
+        # Sin avanzar el checkpoint: las filas se acumulan para la siguiente ejecución
+        run.update(status='skipped', reason=f"{len(y_new)} new labeled rows (< {min_rows})",
+                   seconds=time.perf_counter() - start)
+        state.save_frame('reservoir.pkl', (reservoir.X, reservoir.y))
+        state.save()
+        return None, run
+
+    pipeline = joblib.load(model_path)
+    clf = pipeline.steps[-1][1]
+    param = STAGE_PARAMS.get(type(clf).__name__)
+    if state.base_stages is None and param:
+        state.base_stages = clf.get_params()[param]
+    max_stages = max_stages or (3 * state.base_stages if state.base_stages else 0)
+
+    X_hold, y_hold = holdout
+    before = scores(pipeline, X_hold, y_hold)
+    # Precisión del modelo actual en las filas nuevas antes de aprender de ellas
+    run['new_rows_accuracy_before'] = float((pipeline.predict(X_new) == y_new).mean())
+
+    X_train = pd.concat([X_new, reservoir.X], ignore_index=True) if len(reservoir) else X_new
+    y_train = np.concatenate([y_new, reservoir.y])
+    fit_start = time.perf_counter()
+    candidate, info = update(pipeline, X_train, y_train, stages, max_stages, state.base_stages)
+    run.update(info, train_rows=len(y_train), fit_seconds=time.perf_counter() - fit_start)
+    after = scores(candidate, X_hold, y_hold)
+    run.update(holdout_before=before, holdout_after=after,
+               accepted=after[metric] >= before[metric] - max_drop)
+
+    reservoir.add(X_new, y_new)
+    state.reservoir_seen = reservoir.seen
+    state.feedback_after_id = summary['feedback_after_id']
+    state.pending = pending
+
+    artifact = None
+    if run['accepted']:
+        metadata = {
+            'created_at': datetime.now().isoformat(),
+            'candidate': 'incremental',
+            'estimator': type(candidate.steps[-1][1]).__name__,
+            'parent_version': file_checksum(model_path)[:12],
+            'retrain': {k: v for k, v in run.items() if k not in ('holdout_before', 'holdout_after')},
+            'test': after,
+            'test_before': before,
+            'selection': {'metric': metric, 'max_drop': max_drop},
+            'data': {'holdout': state.holdout, 'feedback_db': os.path.abspath(feedback_path),
+                     'feedback_after_id': state.feedback_after_id, 'reservoir_rows': len(reservoir),
+                     'reservoir_seen': reservoir.seen},
+            'libraries': library_versions(),
+        }
+        artifact = write_artifact(candidate, metadata, output_dir)
+        run['artifact'] = artifact
+    run['seconds'] = time.perf_counter() - start
+    state.save_frame('reservoir.pkl', (reservoir.X, reservoir.y))
+    state.runs = (state.runs + [run])[-50:]
+    state.save()
+    return artifact, run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', DEFAULT_MODEL_PATH), help='modelo de partida')
+    parser.add_argument('--feedback-db', default=os.getenv('FEEDBACK_DB', DEFAULT_FEEDBACK_DB))
+    parser.add_argument('--state-dir', default=DEFAULT_STATE_DIR)
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--data', default=os.getenv('PATH_TO_DATA'),
+                        help='CSV del dataset; solo se usa la primera vez (holdout y reservorio inicial)')
+    parser.add_argument('--stages', type=int, default=10, help='etapas que añade cada ejecución con warm start')
+    parser.add_argument('--max-stages', type=int, default=None,
+                        help='por encima se reajusta sobre el reservorio (por defecto, 3 veces las del modelo inicial)')
+    parser.add_argument('--min-rows', type=int, default=50, help='filas nuevas etiquetadas necesarias')
+    parser.add_argument('--reservoir-size', type=int, default=20000)
+    parser.add_argument('--metric', default='accuracy', choices=METRICS)
+    parser.add_argument('--max-drop', type=float, default=0.002, help='caída máxima de la métrica en el holdout')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--publish', nargs='?', const=os.getenv('MODEL_PATH', DEFAULT_MODEL_PATH), default=None,
+                        help='copiar el modelo aceptado a MODEL_PATH (o a la ruta indicada)')
+    args = parser.parse_args(argv)
+
+    artifact, run = retrain(args.model, args.feedback_db, args.state_dir, args.output_dir, args.data, args.stages,
+                            args.max_stages, args.min_rows, args.reservoir_size, args.metric, args.max_drop,
+                            args.seed)
+    if run.get('status') == 'skipped':
+        print(f"skipped: {run['reason']}")
+        return
+    print(f"{run['labeled_rows']} new labeled rows ({run['feedback_read']} feedback read, {run['pending']} pending); "
+          f"{run['strategy']} {run['stages_before']} -> {run['stages_after']} on {run['train_rows']} rows "
+          f"in {run['fit_seconds']:.2f} s")
+    print(f"holdout {args.metric}: {run['holdout_before'][args.metric]:.4f} -> {run['holdout_after'][args.metric]:.4f} "
+          f"({'accepted' if run['accepted'] else 'rejected'}); total {run['seconds']:.2f} s")
+    if artifact:
+        print(f"artifact: {artifact}")
+        if args.publish:
+            publish(artifact, args.publish)
+            print(f"published to {args.publish}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Puntuación masiva de ficheros de pasajeros (CSV o Parquet) por bloques y en paralelo.
+
+El fichero se lee en bloques de ``--chunk-size`` filas y cada bloque se puntúa en
+un pool de procesos; cada worker carga el pipeline una sola vez. Como mucho hay
+``2 * workers`` bloques en vuelo, así que la memoria no depende del tamaño del
+fichero. Los bloques se escriben en orden al fichero de salida (columnas de
+entrada + ``Age Group`` + ``prediction`` + ``probability``) y, con ``--load``, se
+insertan en la tabla ``data``.
+
+Acepta las columnas del dataset original (``Gender``, ``Customer Type``...) o
+los campos de ``FeatureSchema`` (``gender``, ``customer``...). Parquet necesita
+``pyarrow``.
+
+Uso:
+    python score.py entrada.csv salida.csv [--workers 4] [--chunk-size 50000] [--load]
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from encoder import COLUMN_TO_FIELD, FIELD_TO_COLUMN, age_groups
+
+_bundle = None
+
+
+def _init_worker(model_path, inference_engine):
+    # Una carga del pipeline por proceso, no por bloque
+    global _bundle
+    from registry import ModelBundle
+
+    _bundle = ModelBundle(model_path, inference_engine)
+
+
+def prepare(chunk):
+    """Nombres de columna del dataset, retrasos imputados como en el notebook y ``Age Group``."""
+    chunk = chunk.rename(columns=FIELD_TO_COLUMN)
+    missing = [c for c in COLUMN_TO_FIELD if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Input is missing columns: {missing}")
+    arrival = 'Arrival Delay in Minutes'
+    chunk[arrival] = chunk[arrival].fillna(chunk['Departure Delay in Minutes'])
+    # Misma regla que crud.which_age (el pipeline ajustado descarta esta columna, se guarda en la salida)
+    chunk['Age Group'] = age_groups(chunk['Age'])
+    return chunk
+
+
+def score_chunk(chunk):
+    chunk = prepare(chunk)
+    clf = _bundle.classifier
+    proba = clf.predict_proba(_bundle.features.encode_frame(chunk))
+    chunk['prediction'] = clf.classes_[proba.argmax(axis=1)]
+    chunk['probability'] = proba[:, 1]
+    return chunk
+
+
+def read_chunks(path, chunk_size):
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet input requires pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class ChunkWriter:
+    """Escribe bloques en CSV (con cabecera solo en el primero) o en Parquet."""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet = None
+        self._first = True
+
+    def write(self, chunk):
+        if self.path.endswith('.parquet'):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def load_rows(chunk, connection, table):
+    # Solo los campos de FeatureSchema + prediction, con los tipos de la tabla data
+    import summary
+
+    rows = pd.DataFrame({f: chunk[c] for f, c in FIELD_TO_COLUMN.items()})
+    rows['prediction'] = chunk['prediction'].astype(str)
+    records = rows.astype(object).where(rows.notna(), None).to_dict('records')
+    connection.execute(table.insert(), records)
+    for stmt, params in summary.upsert_statements(records):
+        connection.execute(stmt, params)
+
+
+def score_file(input_path, output_path, workers=None, chunk_size=50000, load=False,
+               model_path=None, inference_engine=None):
+    from registry import DEFAULT_MODEL_PATH
+
+    workers = workers or os.cpu_count()
+    model_path = os.path.abspath(model_path or os.getenv('MODEL_PATH', DEFAULT_MODEL_PATH))
+    inference_engine = inference_engine or os.getenv('INFERENCE_ENGINE', 'sklearn')
+
+    engine = table = None
+    if load:
+        import db
+        import model
+
+        db.init_db()
+        engine, table = db.engine, model.Data.__table__
+
+    writer = ChunkWriter(output_path)
+    rows = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path, inference_engine)) as pool:
+        pending = deque()
+
+        def drain_one():
+            nonlocal rows
+            chunk = pending.popleft().result()
+            writer.write(chunk)
+            if engine is not None:
+                with engine.begin() as connection:
+                    load_rows(chunk, connection, table)
+            rows += len(chunk)
+
+        try:
+            for chunk in read_chunks(input_path, chunk_size):
+                # Backpressure: no se lee otro bloque hasta que haya hueco
+                if len(pending) >= 2 * workers:
+                    drain_one()
+                pending.append(pool.submit(score_chunk, chunk))
+            while pending:
+                drain_one()
+        finally:
+            writer.close()
+    elapsed = time.perf_counter() - start
+    return {"rows": rows, "seconds": elapsed, "rows_per_s": rows / elapsed if elapsed else 0.0, "workers": workers}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--workers', type=int, default=None, help='procesos (por defecto, uno por CPU)')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--load', action='store_true', help='insertar también en la tabla data')
+    parser.add_argument('--model', default=None, help='ruta del pipeline (por defecto MODEL_PATH)')
+    parser.add_argument('--engine', default=None, choices=['sklearn', 'compiled'])
+    args = parser.parse_args(argv)
+
+    stats = score_file(args.input, args.output, args.workers, args.chunk_size, args.load, args.model, args.engine)
+    print(f"{stats['rows']} rows scored in {stats['seconds']:.1f}s "
+          f"({stats['rows_per_s']:.0f} rows/s, {stats['workers']} workers) -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Servidor de producción: carga el modelo una vez y hace fork de N workers uvicorn.
+
+El proceso padre importa la API (FastAPI, pandas, sklearn), crea el esquema,
+carga y calienta el modelo con sus tablas del ``FeatureEncoder`` y abre el
+socket. Después congela el heap con ``gc.freeze()`` y hace ``fork`` de los
+workers, que comparten esas páginas copy-on-write: como el recolector no
+vuelve a recorrer los objetos congelados, no escribe en sus cabeceras y las
+páginas siguen compartidas. Cada worker limita sus hilos de BLAS/OpenMP con
+``threadpoolctl`` (``--threads``, por defecto 1, para no sobresuscribir la CPU
+con N workers) y sirve con su propio event loop sobre el socket común.
+
+El padre solo supervisa: si un worker muere lo sustituye, y SIGTERM/SIGINT se
+reenvían a los workers para que terminen sus peticiones y vacíen la cola
+write-behind. La recarga en caliente sigue funcionando en cada worker, aunque
+la versión nueva ya no se comparte hasta reiniciar el servidor. ``/metrics`` y
+``/cache/stats`` son por worker.
+
+Uso:
+    python serve.py [--workers 4] [--threads 1] [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+logger = logging.getLogger('serve')
+
+# Un worker que muere antes de este tiempo se considera un fallo de arranque: se espera antes de sustituirlo
+MIN_WORKER_LIFETIME = 1.0
+
+
+def preload():
+    """Todo lo que se comparte entre workers: módulos, esquema y modelo calentado."""
+    import crud
+    import db
+    import main
+    import summary
+
+    if os.getenv('DB_CREATE_SCHEMA', '1') == '1':
+        db.init_db()
+        with db.SessionLocal() as session:
+            summary.backfill_if_empty(session)
+        # Los workers no repiten la creación del esquema (evita carreras entre ellos)
+        os.environ['DB_CREATE_SCHEMA'] = '0'
+    crud.registry.load()
+    # Ninguna conexión abierta en el padre debe heredarse: cada worker abre las suyas
+    db.engine.dispose()
+    return main.app
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Las conexiones aceptadas lo heredan; sin él, Nagle + ACK retardado suma ~40 ms por petición keep-alive
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, threads, log_level):
+    import uvicorn
+    from threadpoolctl import threadpool_limits
+
+    import db
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    threadpool_limits(threads)
+    db.engine.dispose(close=False)
+    config = uvicorn.Config(app, log_level=log_level, access_log=False, lifespan='on')
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, app, sock, workers, threads, log_level='warning'):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.log_level = log_level
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app, self.sock, self.threads, self.log_level)
+            except BaseException:
+                logger.exception("worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                # Sin volver al código del padre (ni a sus atexit)
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        return pid
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # Lo cargado hasta aquí queda fuera del recolector: sus páginas no se tocan tras el fork
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.workers):
+            self.spawn()
+        logger.warning("serving on %s with %d workers (pid %d)",
+                       self.sock.getsockname()[:2], self.workers, os.getpid())
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            logger.warning("worker %d exited with status %d, replacing it", pid, os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self.spawn()
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=os.getenv('SERVE_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('SERVE_PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVE_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('SERVE_THREADS', 1)),
+                        help='hilos de BLAS/OpenMP por worker')
+    parser.add_argument('--log-level', default=os.getenv('SERVE_LOG_LEVEL', 'warning'))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    app = preload()
+    sock = bind_socket(args.host, args.port)
+    Supervisor(app, sock, args.workers, args.threads, args.log_level).run()
+
+
+if __name__ == '__main__':
+    main()
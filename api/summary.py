@@ -0,0 +1,144 @@
+"""Agregados de satisfacción de la tabla ``data`` mantenidos de forma incremental.
+
+Cada inserción en ``data`` (``/predict/``, ``/predict/batch``, write-behind y
+``score.py --load``) añade en la misma transacción un upsert sobre
+``data_summary``: total y satisfechos por clase, tipo de cliente, tipo de viaje
+y grupo de edad. ``GET /data/summary`` lee solo esa tabla (como mucho unos
+cientos de filas), nunca ``data``.
+
+Uso:
+    python summary.py   # recalcula data_summary a partir de data (p. ej. tras una carga externa)
+"""
+from collections import Counter
+
+from sqlalchemy import delete, func, insert, select
+
+import model
+from db import engine
+from encoder import which_age
+
+DIMENSIONS = ('class_flight', 'customer', 'type_travel', 'age_group')
+UNKNOWN = 'unknown'
+
+
+def segment(row):
+    age_group = which_age(row['age']) or UNKNOWN
+    return row['class_flight'], row['customer'], row['type_travel'], age_group
+
+
+def deltas(rows):
+    """Filas de data (dicts con ``prediction``) -> {segmento: (total, satisfechos)}."""
+    totals, satisfied = Counter(), Counter()
+    for row in rows:
+        key = segment(row)
+        totals[key] += 1
+        if str(row['prediction']) == '1':
+            satisfied[key] += 1
+    return {key: (n, satisfied[key]) for key, n in totals.items()}
+
+
+_upserts = {}
+
+
+def _upsert(dialect):
+    # Una sentencia por dialecto, creada una vez: se ejecuta como executemany y SQLAlchemy cachea su compilación
+    stmt = _upserts.get(dialect)
+    if stmt is not None:
+        return stmt
+    table = model.DataSummary.__table__
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update(total=table.c.total + stmt.inserted.total,
+                                            satisfied=table.c.satisfied + stmt.inserted.satisfied)
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(DIMENSIONS),
+                                          set_={'total': table.c.total + stmt.excluded.total,
+                                                'satisfied': table.c.satisfied + stmt.excluded.satisfied})
+    else:
+        raise ValueError(f"Unsupported dialect for data_summary upserts: {dialect}")
+    _upserts[dialect] = stmt
+    return stmt
+
+
+def upsert_statements(rows, dialect=None):
+    """[(sentencia, parámetros)] a ejecutar en la transacción que inserta ``rows`` en data."""
+    changes = deltas(rows)
+    if not changes:
+        return []
+    params = [dict(zip(DIMENSIONS, key), total=n, satisfied=s) for key, (n, s) in changes.items()]
+    return [(_upsert(dialect or engine.dialect.name), params)]
+
+
+def rates(db):
+    """Tasa de satisfacción global y por cada dimensión, a partir de data_summary."""
+    rows = db.execute(select(model.DataSummary)).scalars().all()
+    by = {dim: {} for dim in DIMENSIONS}
+    total = satisfied = 0
+    for row in rows:
+        total += row.total
+        satisfied += row.satisfied
+        for dim in DIMENSIONS:
+            acc = by[dim].setdefault(getattr(row, dim), [0, 0])
+            acc[0] += row.total
+            acc[1] += row.satisfied
+    return {
+        "total": total,
+        "satisfied": satisfied,
+        "rate": satisfied / total if total else None,
+        "by": {
+            dim: [{"value": value, "total": n, "satisfied": s, "rate": s / n if n else None}
+                  for value, (n, s) in sorted(groups.items())]
+            for dim, groups in by.items()
+        },
+    }
+
+
+def rebuild(db, chunk_size=10000):
+    """Recalcula data_summary recorriendo data por bloques de id (sin cargarla entera)."""
+    data = model.Data
+    columns = [data.id, data.class_flight, data.customer, data.type_travel, data.age, data.prediction]
+    changes = Counter()
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(*columns).where(data.id > last_id).order_by(data.id).limit(chunk_size)).mappings().all()
+        if not rows:
+            break
+        for key, (n, s) in deltas(rows).items():
+            changes[key, 'total'] += n
+            changes[key, 'satisfied'] += s
+        last_id = rows[-1]['id']
+
+    db.execute(delete(model.DataSummary))
+    keys = {key for key, _ in changes}
+    if keys:
+        db.execute(insert(model.DataSummary), [
+            dict(zip(DIMENSIONS, key), total=changes[key, 'total'], satisfied=changes[key, 'satisfied'])
+            for key in keys
+        ])
+    db.commit()
+    return len(keys)
+
+
+def backfill_if_empty(db):
+    # Al crear data_summary sobre una tabla data que ya tenía filas
+    has_summary = db.execute(select(func.count()).select_from(model.DataSummary)).scalar()
+    if not has_summary and db.execute(select(model.Data.id).limit(1)).first() is not None:
+        return rebuild(db)
+    return 0
+
+
+if __name__ == '__main__':
+    from db import SessionLocal, init_db
+
+    init_db()
+    with SessionLocal() as session:
+        print(f"data_summary rebuilt: {rebuild(session)} segments")
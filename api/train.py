@@ -0,0 +1,376 @@
+"""Entrenamiento reproducible del pipeline con búsqueda de modelos en paralelo.
+
+Sustituye a las celdas del notebook con el mismo preprocesado: el retraso de
+llegada se imputa con el de salida, se añade ``Age Group`` y se usa el mismo
+``ColumnTransformer`` (mediana + StandardScaler y one-hot). El split de test
+también es el mismo (20 %, random_state=42). Del resto se separa una
+validación, y cada combinación de candidato e hiperparámetros se ajusta en un
+pool de procesos; cada worker lee el dataset una sola vez.
+
+Los candidatos ajustados se miden después en el proceso principal, uno a uno y
+como los sirve la API (``FeatureEncoder`` + ``predict_proba``, y también el
+motor compilado cuando es posible). Se mide la latencia de una fila (p50/p95),
+la latencia por fila de un lote y el tamaño del artefacto. Gana el candidato
+que maximiza
+
+    métrica de validación - latency_weight * p95 de una fila (ms)
+
+entre los que cumplen ``--max-latency-ms`` y ``--max-size-mb``. El ganador se
+reentrena con train + validación y se evalúa en test. Se guarda como
+``model_pipeline-<fecha>-<versión>.pkl`` junto a un ``.json`` de metadatos;
+``<versión>`` son los 12 primeros caracteres del sha256, la misma que muestra
+``GET /health``. Con ``--publish`` el artefacto se copia de forma atómica a
+MODEL_PATH y la API lo recarga en caliente.
+
+XGBoost y CatBoost son opcionales: si no están instalados, sus candidatos se
+omiten.
+
+Uso:
+    python train.py path/to/airline_passenger_satisfaction.csv [--workers 4] [--latency-weight 0.01] [--publish]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import ParameterGrid, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+import engine
+from encoder import COLUMN_TO_FIELD, COLUMNS, FIELDS, FeatureEncoder
+from registry import DEFAULT_MODEL_PATH, file_checksum
+from score import prepare
+
+SATISFACTION = {'neutral or dissatisfied': 0, 'satisfied': 1}
+NUM_COLUMNS = ['Age', 'Flight Distance', 'Departure Delay in Minutes', 'Arrival Delay in Minutes']
+CAT_COLUMNS = [c for c in COLUMN_TO_FIELD if c not in NUM_COLUMNS]
+METRICS = ('accuracy', 'roc_auc', 'precision', 'recall', 'f1')
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(DEFAULT_MODEL_PATH), 'models')
+
+
+def candidates():
+    """nombre -> (clase del clasificador, rejilla de hiperparámetros).
+
+    Un hilo por modelo: el paralelismo está entre procesos.
+    """
+    from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+
+    grids = {
+        'logistic_regression': (LogisticRegression, {'C': [0.2, 1.0], 'max_iter': [1000]}),
+        'random_forest': (RandomForestClassifier, {
+            'n_estimators': [100], 'max_depth': [8, 16], 'n_jobs': [1], 'random_state': [0]}),
+        # La configuración del notebook (model_pipeline.pkl) y dos variantes
+        'gradient_boosting': (GradientBoostingClassifier, {
+            'loss': ['exponential'], 'learning_rate': [0.3], 'min_samples_split': [4],
+            'n_estimators': [50, 100], 'max_depth': [3, 4], 'random_state': [0]}),
+        'hist_gradient_boosting': (HistGradientBoostingClassifier, {
+            'learning_rate': [0.1], 'max_iter': [100, 300], 'max_leaf_nodes': [31, 63], 'random_state': [0]}),
+    }
+    try:
+        from xgboost import XGBClassifier
+
+        grids['xgboost'] = (XGBClassifier, {
+            'n_estimators': [200, 400], 'max_depth': [6], 'learning_rate': [0.1],
+            'tree_method': ['hist'], 'n_jobs': [1], 'random_state': [0]})
+    except ImportError:
+        pass
+    try:
+        from catboost import CatBoostClassifier
+
+        grids['catboost'] = (CatBoostClassifier, {
+            'iterations': [300, 600], 'depth': [6], 'learning_rate': [0.1], 'thread_count': [1],
+            'verbose': [0], 'allow_writing_files': [False], 'random_seed': [0]})
+    except ImportError:
+        pass
+    return grids
+
+
+def build_preprocessor():
+    # El ColumnTransformer de model_pipeline.pkl (Age Group se descarta, como en el notebook)
+    return ColumnTransformer(transformers=[
+        ('num', Pipeline(steps=[('imputer', SimpleImputer(strategy='median')),
+                                ('scaler', StandardScaler())]), NUM_COLUMNS),
+        # Salida densa: HistGradientBoosting no acepta matrices dispersas (FeatureEncoder siempre codifica en denso)
+        ('cat', Pipeline(steps=[('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
+                                ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))]),
+         CAT_COLUMNS),
+    ])
+
+
+def build_pipeline(name, params):
+    classifier, _ = candidates()[name]
+    return Pipeline(steps=[('preprocessor', build_preprocessor()), ('model', classifier(**params))])
+
+
+def load_dataset(path):
+    """CSV del dataset -> (X con COLUMNS, y en 0/1), con el preprocesado del notebook."""
+    df = prepare(pd.read_csv(path))
+    target = df['satisfaction']
+    if target.dtype == object:
+        target = target.map(SATISFACTION)
+    if target.isna().any():
+        raise ValueError(f"Unexpected satisfaction values: {sorted(df['satisfaction'][target.isna()].unique())}")
+    return df[COLUMNS], target.astype(int)
+
+
+def split_dataset(X, y, validation_size=0.2, seed=0):
+    # Mismo test que el notebook (y que engine.load_holdout); la validación sale del resto
+    X_rest, X_test, y_rest, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_rest, y_rest, test_size=validation_size, random_state=seed, stratify=y_rest)
+    return {'train': (X_train, y_train), 'validation': (X_val, y_val), 'test': (X_test, y_test)}
+
+
+def scores(pipeline, X, y):
+    proba = pipeline.predict_proba(X)[:, 1]
+    pred = (proba >= 0.5).astype(int)
+    return {
+        'accuracy': float(accuracy_score(y, pred)),
+        'roc_auc': float(roc_auc_score(y, proba)),
+        'precision': float(precision_score(y, pred, zero_division=0)),
+        'recall': float(recall_score(y, pred, zero_division=0)),
+        'f1': float(f1_score(y, pred, zero_division=0)),
+    }
+
+
+_splits = None
+
+
+def _init_worker(data_path, validation_size, seed):
+    # Una lectura del dataset por proceso y un solo hilo de BLAS/OpenMP por worker
+    global _splits
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(1)
+    _splits = split_dataset(*load_dataset(data_path), validation_size, seed)
+
+
+def fit_candidate(name, params):
+    X_train, y_train = _splits['train']
+    X_val, y_val = _splits['validation']
+    result = {'candidate': name, 'params': params}
+    try:
+        pipeline = build_pipeline(name, params)
+        start = time.perf_counter()
+        pipeline.fit(X_train, y_train)
+        result['fit_seconds'] = time.perf_counter() - start
+        result['train_accuracy'] = float(pipeline.score(X_train, y_train))
+        result['validation'] = scores(pipeline, X_val, y_val)
+    except Exception as e:
+        # Un candidato que falla no para la búsqueda; queda registrado en los metadatos
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result, None
+    return result, pipeline
+
+
+def artifact_size(pipeline):
+    buffer = io.BytesIO()
+    joblib.dump(pipeline, buffer)
+    return buffer.tell()
+
+
+def serving_cost(pipeline, X, repeats=300, batch_size=1000):
+    """Latencia como la sirve la API (codificación + predict_proba) y tamaño del artefacto."""
+    features = FeatureEncoder(pipeline)
+    records = X.iloc[:batch_size].rename(columns=COLUMN_TO_FIELD)[FIELDS].to_dict('records')
+    classifiers = {'sklearn': pipeline.steps[-1][1]}
+    if engine.supports(classifiers['sklearn']):
+        classifiers['compiled'] = engine.CompiledForest(classifiers['sklearn'])
+
+    by_engine = {}
+    for name, clf in classifiers.items():
+        for record in records[:20]:
+            clf.predict_proba(features.encode(record))
+        single = np.empty(repeats)
+        for i in range(repeats):
+            record = records[i % len(records)]
+            start = time.perf_counter()
+            clf.predict_proba(features.encode(record))
+            single[i] = time.perf_counter() - start
+        batch = min(_timed(lambda: clf.predict_proba(features.encode_records(records))) for _ in range(5))
+        by_engine[name] = {
+            'single_p50_ms': float(np.percentile(single, 50) * 1e3),
+            'single_p95_ms': float(np.percentile(single, 95) * 1e3),
+            'batch_us_per_row': batch / len(records) * 1e6,
+        }
+    best = min(by_engine, key=lambda name: by_engine[name]['single_p95_ms'])
+    return {'engine': best, **by_engine[best], 'engines': by_engine, 'size_bytes': artifact_size(pipeline)}
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def select(results, metric='accuracy', latency_weight=0.01, max_latency_ms=None, max_size_mb=None):
+    """Añade ``objective`` a cada resultado y devuelve el mejor que cumple los presupuestos (o None)."""
+    eligible = []
+    for r in results:
+        if 'error' in r:
+            continue
+        serving = r['serving']
+        r['objective'] = r['validation'][metric] - latency_weight * serving['single_p95_ms']
+        within = ((max_latency_ms is None or serving['single_p95_ms'] <= max_latency_ms)
+                  and (max_size_mb is None or serving['size_bytes'] <= max_size_mb * 1e6))
+        r['eligible'] = within
+        if within:
+            eligible.append(r)
+    return max(eligible, key=lambda r: r['objective'], default=None)
+
+
+def search(data_path, names=None, workers=None, validation_size=0.2, seed=0):
+    """Ajusta todas las combinaciones en paralelo y mide después cada una en serie."""
+    grids = candidates()
+    unknown = [n for n in names or () if n not in grids]
+    if unknown:
+        raise ValueError(f"Unknown or unavailable candidates: {unknown} (available: {sorted(grids)})")
+    tasks = [(name, params) for name in names or grids for params in ParameterGrid(grids[name][1])]
+    workers = workers or os.cpu_count()
+
+    fitted = []
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data_path, validation_size, seed)) as pool:
+        futures = [pool.submit(fit_candidate, name, params) for name, params in tasks]
+        for future in as_completed(futures):
+            result, pipeline = future.result()
+            status = result.get('error') or f"{result['validation']['accuracy']:.4f} accuracy"
+            print(f"  {result['candidate']} {result['params']}: {status}")
+            fitted.append((result, pipeline))
+
+    # Las latencias se miden sin otros workers compitiendo por la CPU
+    X_val, _ = split_dataset(*load_dataset(data_path), validation_size, seed)['validation']
+    for result, pipeline in fitted:
+        if pipeline is not None:
+            result['serving'] = serving_cost(pipeline, X_val)
+    return [result for result, _ in fitted]
+
+
+def library_versions():
+    import sklearn
+
+    versions = {'python': platform.python_version(), 'scikit-learn': sklearn.__version__,
+                'numpy': np.__version__, 'pandas': pd.__version__}
+    for module in ('xgboost', 'catboost'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    return versions
+
+
+def write_artifact(pipeline, metadata, output_dir):
+    """Guarda ``model_pipeline-<fecha>-<versión>.pkl`` y su ``.json``; devuelve la ruta del pkl."""
+    os.makedirs(output_dir, exist_ok=True)
+    tmp = os.path.join(output_dir, '.model_pipeline.pkl.tmp')
+    joblib.dump(pipeline, tmp)
+    version = file_checksum(tmp)[:12]
+    base = os.path.join(output_dir, f"model_pipeline-{datetime.now():%Y%m%d%H%M%S}-{version}")
+    metadata = {'version': version, **metadata}
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, default=str)
+    os.replace(tmp, base + '.pkl')
+    return base + '.pkl'
+
+
+def publish(artifact, model_path):
+    # Copia y rename atómico: el watcher del registro nunca ve un fichero a medio escribir
+    tmp = model_path + '.tmp'
+    shutil.copyfile(artifact, tmp)
+    os.replace(tmp, model_path)
+
+
+def train(data_path, output_dir=DEFAULT_OUTPUT_DIR, names=None, workers=None, metric='accuracy',
+          latency_weight=0.01, max_latency_ms=None, max_size_mb=None, validation_size=0.2, seed=0):
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r} (expected one of {METRICS})")
+    start = time.perf_counter()
+    results = search(data_path, names, workers, validation_size, seed)
+    search_seconds = time.perf_counter() - start
+    best = select(results, metric, latency_weight, max_latency_ms, max_size_mb)
+    if best is None:
+        raise RuntimeError("No candidate fits the latency/size budget")
+
+    # Reentrenar el ganador con train + validación y evaluarlo una sola vez en test
+    splits = split_dataset(*load_dataset(data_path), validation_size, seed)
+    X_fit = pd.concat([splits['train'][0], splits['validation'][0]])
+    y_fit = pd.concat([splits['train'][1], splits['validation'][1]])
+    pipeline = build_pipeline(best['candidate'], best['params'])
+    pipeline.fit(X_fit, y_fit)
+    X_test, y_test = splits['test']
+
+    metadata = {
+        'created_at': datetime.now().isoformat(),
+        'candidate': best['candidate'],
+        'estimator': type(pipeline.steps[-1][1]).__name__,
+        'params': best['params'],
+        'inference_engine': best['serving']['engine'],
+        'validation': best['validation'],
+        'test': scores(pipeline, X_test, y_test),
+        'serving': serving_cost(pipeline, X_test),
+        'selection': {'metric': metric, 'latency_weight': latency_weight,
+                      'max_latency_ms': max_latency_ms, 'max_size_mb': max_size_mb},
+        'data': {'path': os.path.abspath(data_path), 'sha256': file_checksum(data_path),
+                 'train_rows': len(X_fit), 'test_rows': len(X_test),
+                 'validation_size': validation_size, 'seed': seed},
+        'search': {'seconds': search_seconds, 'workers': workers or os.cpu_count(),
+                   'results': sorted(results, key=lambda r: r.get('objective', -np.inf), reverse=True)},
+        'libraries': library_versions(),
+    }
+    return write_artifact(pipeline, metadata, output_dir), metadata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('data', nargs='?', default=os.getenv('PATH_TO_DATA'), help='CSV del dataset (PATH_TO_DATA)')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--candidates', default=None, help='lista separada por comas (por defecto, todos los disponibles)')
+    parser.add_argument('--workers', type=int, default=None, help='procesos (por defecto, uno por CPU)')
+    parser.add_argument('--metric', default='accuracy', choices=METRICS)
+    parser.add_argument('--latency-weight', type=float, default=0.01,
+                        help='puntos de la métrica que cuesta cada ms de p95 de una fila')
+    parser.add_argument('--max-latency-ms', type=float, default=None)
+    parser.add_argument('--max-size-mb', type=float, default=None)
+    parser.add_argument('--validation-size', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--publish', nargs='?', const=os.getenv('MODEL_PATH', DEFAULT_MODEL_PATH), default=None,
+                        help='copiar el ganador a MODEL_PATH (o a la ruta indicada)')
+    args = parser.parse_args(argv)
+    if not args.data:
+        parser.error('the dataset path is required (argument or PATH_TO_DATA)')
+
+    names = args.candidates.split(',') if args.candidates else None
+    artifact, metadata = train(args.data, args.output_dir, names, args.workers, args.metric, args.latency_weight,
+                               args.max_latency_ms, args.max_size_mb, args.validation_size, args.seed)
+
+    print(f"\n{'candidate':<24}{args.metric:>10}{'p95 ms':>9}{'µs/row':>9}{'MB':>8}{'objective':>11}  params")
+    for r in metadata['search']['results']:
+        params = ' '.join(f"{k}={v}" for k, v in r['params'].items())
+        if 'error' in r:
+            print(f"{r['candidate']:<24}{r['error']}  {params}")
+            continue
+        s = r['serving']
+        print(f"{r['candidate']:<24}{r['validation'][args.metric]:>10.4f}{s['single_p95_ms']:>9.3f}"
+              f"{s['batch_us_per_row']:>9.1f}{s['size_bytes'] / 1e6:>8.2f}{r['objective']:>11.4f}  {params}"
+              f"{'' if r['eligible'] else '  (over budget)'}")
+    print(f"\nselected {metadata['candidate']} (INFERENCE_ENGINE={metadata['inference_engine']}): "
+          f"test {args.metric}={metadata['test'][args.metric]:.4f} -> {artifact}")
+    if args.publish:
+        publish(artifact, args.publish)
+        print(f"published to {args.publish}")
+
+
+if __name__ == '__main__':
+    main()
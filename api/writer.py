@@ -0,0 +1,183 @@
+"""Persistencia write-behind de las predicciones.
+
+Las filas puntuadas se encolan en memoria y un hilo las inserta por lotes
+(por tamaño o por tiempo) con un único ``executemany``, de modo que la latencia
+de /predict/ no depende del round trip a la tabla ``data``. Si la base de datos
+falla se reintenta con backoff y, agotados los reintentos, el lote se guarda en
+un fichero dead-letter (NDJSON) para reinsertarlo después. Cualquier otro error
+(filas mal formadas, fallo al escribir el dead-letter...) se registra y el hilo
+sigue con el siguiente lote.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    def __init__(self, session_factory, table, maxsize=10000, batch_size=500,
+                 flush_interval=0.5, max_retries=3, retry_backoff=0.5,
+                 put_timeout=1.0, dead_letter_path='dead_letter.ndjson', extra_statements=None):
+        self._session_factory = session_factory
+        self._table = table
+        # extra_statements(rows) -> [(sentencia, parámetros)] a ejecutar en la misma transacción (p. ej. agregados)
+        self._extra_statements = extra_statements
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.put_timeout = put_timeout
+        self.dead_letter_path = dead_letter_path
+        self._dead_letter_lock = threading.Lock()
+        # Los contadores los actualizan tanto los productores (submit) como el hilo de escritura
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, row):
+        return self.submit_many([row])
+
+    def submit_many(self, rows):
+        """Encola filas; si la cola sigue llena tras ``put_timeout`` (backpressure),
+        las filas restantes van directamente al dead-letter y se devuelve False."""
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+        self.start()
+        for i, row in enumerate(rows):
+            try:
+                self._queue.put(row, timeout=self.put_timeout)
+            except queue.Full:
+                pending = rows[i:]
+                self._count(enqueued=i, rejected=len(pending))
+                self._dead_letter(pending, "queue full")
+                return False
+        self._count(enqueued=len(rows))
+        return True
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._safe_flush(batch)
+
+        # Vaciar lo que quede antes de terminar
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rest.append(item)
+        for i in range(0, len(rest), self.batch_size):
+            self._safe_flush(rest[i:i + self.batch_size])
+
+    def _safe_flush(self, rows):
+        # Un error inesperado no puede parar el hilo: las filas siguientes se perderían en la cola
+        try:
+            self._flush(rows)
+        except Exception:
+            logger.exception("write-behind lost a batch of %d rows", len(rows))
+
+    def _flush(self, rows):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count(retries=1)
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            session = self._session_factory()
+            try:
+                with metrics.DB_COMMIT.time('write_behind'):
+                    session.execute(insert(self._table), rows)
+                    for stmt, params in self._extra_statements(rows) if self._extra_statements else ():
+                        session.execute(stmt, params)
+                    session.commit()
+                self._count(written=len(rows), batches=1)
+                return
+            except Exception as e:
+                session.rollback()
+                metrics.ROLLBACKS.inc('write_behind')
+                metrics.ERRORS.inc('write_behind', type(e).__name__)
+                error = e
+                logger.warning("write-behind flush of %d rows failed (attempt %d): %s", len(rows), attempt + 1, e)
+                if not isinstance(e, SQLAlchemyError):
+                    # No es un fallo de la base de datos (p. ej. una fila mal formada): reintentar no ayuda
+                    break
+            finally:
+                session.close()
+        self._dead_letter(rows, f"{type(error).__name__}: {error}")
+
+    def _dead_letter(self, rows, error):
+        now = datetime.now().isoformat()
+        with self._dead_letter_lock:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps({"row": row, "error": error, "timestamp": now}, default=str) + '\n')
+        self._count(dead_lettered=len(rows))
+        logger.error("%d rows written to dead-letter file %s", len(rows), self.dead_letter_path)
+
+    def close(self, timeout=30.0):
+        """Deja de aceptar filas y espera a que el hilo vacíe la cola."""
+        self._closed = True
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "pending": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "retries": self.retries,
+                "dead_lettered": self.dead_lettered,
+                "rejected": self.rejected,
+            }
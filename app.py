@@ -3,14 +3,24 @@ from dash import dcc, html, State, dash_table
 from dash.dependencies import Input, Output
 import dash_bootstrap_components as dbc
 import plotly.express as px
-import numpy as np
-import pandas as pd
-import sqlite3  # Import sqlite3 for database operations
-from datetime import datetime
-import sklearn
-import pickle
+from plotly.io.json import to_json_plotly
 import requests
-from flask import Flask, send_from_directory
+import atexit
+import json
+import os
+import sys
+from flask import Flask
+
+from dataset import load_dataset
+from datatable import TableQuery
+from dashstats import DashStats
+from feedback import FeedbackStore
+from static import StaticAssets
+
+# Los módulos de la API se importan en plano (igual que al lanzar uvicorn desde api/)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+from encoder import CATEGORIES, FIELD_TO_COLUMN, FIELDS, RATING_FIELDS, RATING_VALUES
+from predictor import make_predictor
 
 PRIMARY_COLOR = "#91C48A"
 SECONDARY_COLOR_1 = "#485751"
@@ -19,17 +29,44 @@ SECONDARY_COLOR_3 = "#FFA9A3"
 TEXT_COLOR = "#FFFFFF"
 BACKGROUND_COLOR = "fafbfd"
 
-# Definición de cols
-cols = ['gender', 'customer', 'age', 'type_travel', 'class_flight',
-        'distance', 'wifi',
-        'arrival_time', 'online_booking',
-        'gate_location', 'food_drink', 'online_boarding', 'seat_confort',
-        'entertainment', 'on_board', 'leg_room',
-        'baggage_handling', 'checkin', 'inflight_serv',
-        'cleanliness', 'departure_delay', 'arrival_dealy']
+# Definición de cols: mismos campos que FeatureSchema, compartidos con la API
+cols = FIELDS
+
+
+# Caché columnar mapeada en memoria (se reconstruye sola si cambia el CSV)
+df = load_dataset('Data/airline_passenger_satisfaction.csv')
+# Índices para filtrar/ordenar/paginar la tabla de la página 3 en el servidor
+table_query = TableQuery(df)
+
+# Backend de predicción (PREDICTION_BACKEND=http|inprocess); se crea una vez y se reutiliza
+predictor = make_predictor()
+
+# game/ y las imágenes de assets/ con URLs versionadas inmutables, gzip/brotli, 304 y Range, desde memoria
+STATIC_CACHE = dict(max_file_size=int(os.getenv('STATIC_MAX_FILE_SIZE', 4 << 20)),
+                    cache_bytes=int(os.getenv('STATIC_CACHE_BYTES', 64 << 20)))
+game_assets = StaticAssets('game', '/game', **STATIC_CACHE)
+site_assets = StaticAssets('assets', '/assets', **STATIC_CACHE)
+
+
+def importance_figure(importances, top=10):
+    # Importancias globales por campo (ya vienen ordenadas de mayor a menor)
+    items = list(importances.items())[:top][::-1]
+    fig = px.bar(x=[v for _, v in items], y=[FIELD_TO_COLUMN[f] for f, _ in items], orientation='h',
+                 labels={'x': 'Importancia', 'y': ''})
+    fig.update_traces(marker_color=PRIMARY_COLOR)
+    return fig
 
 
-df = pd.read_csv('Data/airline_passenger_satisfaction.csv')
+def contribution_figure(data, top=10):
+    # Contribuciones en log-odds de esta predicción: positivas hacia "satisfecho"
+    items = sorted(data['contributions'].items(), key=lambda kv: abs(kv[1]), reverse=True)[:top][::-1]
+    effect = ['Aumenta la satisfacción' if v >= 0 else 'Reduce la satisfacción' for _, v in items]
+    fig = px.bar(x=[v for _, v in items], y=[FIELD_TO_COLUMN[f] for f, _ in items], orientation='h',
+                 color=effect, labels={'x': 'Contribución (log-odds)', 'y': '', 'color': ''},
+                 color_discrete_map={'Aumenta la satisfacción': PRIMARY_COLOR,
+                                     'Reduce la satisfacción': SECONDARY_COLOR_3},
+                 title=f"Valor base: {data['base_value']:.2f}")
+    return fig
 
 server = Flask(__name__)
 app = dash.Dash(__name__, server=server, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME, "https://fonts.googleapis.com/css2?family=Abril+Fatface&display=swap"], suppress_callback_exceptions=True)
@@ -46,56 +83,44 @@ class AirlineApp:
             suppress_callback_exceptions=True
         )
         self.app = app
+        # Layouts de página construidos y serializados una vez (no dependen de la sesión); display_page solo
+        # reenvía el JSON, sin reconstruir ni volver a recorrer el árbol de componentes
+        self.pages = {}
         self.app.layout = self.create_layout()
         self.setup_callbacks()
         self.setup_game_router()
-        self.feedback_data = []
-        self.init_db()  # Initialize the database
+        # Feedback en SQLite (WAL, escrituras por lotes); FEEDBACK_DB cambia la ruta
+        self.feedback = FeedbackStore(os.getenv('FEEDBACK_DB', 'feedback.db'))
+        atexit.register(self.feedback.close)
+        # Peticiones, bytes y tiempo por callback en GET /_dash-stats, solo con DASH_STATS=1: vuelve a parsear
+        # cada cuerpo de callback, serializa las peticiones en un lock y el endpoint no tiene autenticación
+        self.stats = DashStats(server) if os.getenv('DASH_STATS', '0') == '1' else None
 
     def setup_game_router(self):
-        @server.route('/game/<path:path>')
-        def serve_game(path):
-            return send_from_directory('game', path)
+        game_assets.register(server, 'game')
+        # /assets/<ruta> sigue siendo la ruta de Dash; aquí solo se añade la versionada
+        site_assets.register(server, 'site_assets', unversioned=False)
         
+    def page(self, name):
+        layout = self.pages.get(name)
+        if layout is None:
+            builder = {'main-page': self.main_page_content, 'page-2': self.page_2_content,
+                       'page-3': self.page_3_content, 'game-page': self.game_page_content}.get(name)
+            if builder is None:
+                return None
+            layout = self.pages[name] = json.loads(to_json_plotly(builder()))
+        return layout
+
     def game_page_content(self):
         return html.Div([
             html.H1("Flappy Bird de G6 Airline", style={"color": PRIMARY_COLOR}),
             html.Iframe(
-                src="/game/fly.html",
+                src=game_assets.url('fly.html'),
                 style={"width": "640px", "height": "400px", "border": "none"},
                 id="game-iframe"
             )
         ])
 
-    def init_db(self):
-        # Connect to the SQLite database
-        self.conn = sqlite3.connect('feedback.db')
-        self.cursor = self.conn.cursor()
-        # Create the feedback table if it doesn't exist
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                edad INTEGER,
-                ingresos REAL,
-                genero TEXT,
-                prediccion TEXT,
-                feedback TEXT,
-                timestamp TEXT
-            )
-        ''')
-        self.conn.commit()
-
-    def collect_feedback(self, n_clicks, feedback, edad, ingresos, genero, prediccion):
-        if n_clicks > 0 and feedback:
-            # Insert feedback into the database
-            self.cursor.execute('''
-                INSERT INTO feedback (edad, ingresos, genero, prediccion, feedback, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (edad, ingresos, genero, prediccion, feedback, datetime.now().isoformat()))
-            self.conn.commit()
-            return "Gracias por tu feedback!"
-        return ""
-
     def create_layout(self):
         navbar = dbc.Navbar(
             dbc.Container(
@@ -103,7 +128,7 @@ class AirlineApp:
                     html.A(
                         dbc.Row(
                             [
-                                dbc.Col(html.Img(src='assets/1.png', height="150px")),
+                                dbc.Col(html.Img(src=site_assets.url('1.png'), height="150px")),
                                 dbc.Col(dbc.NavbarBrand(
                                     "G6 Airline", 
                                     className="display-2", 
@@ -136,47 +161,44 @@ class AirlineApp:
             clearable=False
         )
 
-        content = html.Div(id='page-content', style={'backgroundColor': BACKGROUND_COLOR, 'color': TEXT_COLOR, 'padding': '20px'})
+        # La página inicial va ya en el layout: display_page no se lanza al cargar
+        content = html.Div(self.page('main-page'), id='page-content', style={'backgroundColor': BACKGROUND_COLOR, 'color': TEXT_COLOR, 'padding': '20px'})
 
         return html.Div([
             navbar,
             dropdown,
-            content
+            content,
+            # Última predicción (id de la fila en la tabla data incluido) para enlazar el feedback
+            dcc.Store(id='ultima-prediccion')
         ])
 
     def setup_callbacks(self):
         @self.app.callback(
             Output('page-content', 'children'),
-            [Input('page-dropdown', 'value')]
+            [Input('page-dropdown', 'value')],
+            prevent_initial_call=True
         )
         def display_page(selected_page):
-            if selected_page == 'main-page':
-                return self.main_page_content()
-            elif selected_page == 'page-2':
-                return self.page_2_content()
-            elif selected_page == 'page-3':
-                return self.page_3_content()
-            elif selected_page == 'game-page':
-                return self.game_page_content()
+            return self.page(selected_page)
     
         @self.app.callback(
             [Output('output-prediccion', 'children'),
              Output('importancia-grafico', 'figure'),
-             Output('contribucion-grafico', 'figure')],
-            [Input('submit-button', 'n_clicks')] +
-            [Input(f'input-{col.lower().replace(" ", "-")}', 'value') for col in cols]
+             Output('contribucion-grafico', 'figure'),
+             Output('ultima-prediccion', 'data')],
+            [Input('submit-button', 'n_clicks')],
+            # State: mover un slider no dispara una predicción, solo el botón
+            [State(f'input-{col.lower().replace(" ", "-")}', 'value') for col in cols],
+            # Sin clic no hay nada que calcular: la página ya se pinta vacía
+            prevent_initial_call=True
         )
         def actualizar_resultados(n_clicks, *inputs):
             if n_clicks > 0:
                 # Crear un diccionario con los valores de entrada
                 input_dict = dict(zip(cols, inputs))
 
-                # Hacer la llamada a la API
-                api_url = "http://127.0.0.1:8000/predict"
                 try:
-                    response = requests.post(api_url, json=input_dict)
-                    response.raise_for_status()  # Esto lanzará una excepción para códigos de estado HTTP no exitosos
-                    data = response.json()
+                    data = predictor.predict(input_dict, explain=True)
 
                     # Obtener el mensaje de la respuesta
                     status_msg = data.get('msg')
@@ -192,57 +214,70 @@ class AirlineApp:
                         else:
                             prediction_label = "Predicción desconocida"
 
-                        return f"Predicción exitosa: {prediction_label}", {}, {}
+                        importances = predictor.importances(data.get('model_version'))
+                        ultima = {'id': data.get('id'), 'prediction': satisfaction_prediction, 'record': input_dict}
+                        return (f"Predicción exitosa: {prediction_label}",
+                                importance_figure(importances) if importances else {},
+                                contribution_figure(data) if 'contributions' in data else {}, ultima)
                     else:
-                        return "Error en la predicción: la API devolvió 'error'", {}, {}
+                        return "Error en la predicción: la API devolvió 'error'", {}, {}, None
         
                 except requests.RequestException as e:  # Manejo de excepciones por problemas de conexión
-                    return f"Error al conectar con la API: {str(e)}", {}, {}
+                    return f"Error al conectar con la API: {str(e)}", {}, {}, None
+                except Exception as e:  # Backend en proceso: fallo al cargar el modelo o al predecir
+                    return f"Error en la predicción: {str(e)}", {}, {}, None
 
-            return "", {}, {}
+            return "", {}, {}, None
 
         @self.app.callback(
+            [Output('tabla-datos', 'data'),
+             Output('tabla-datos', 'page_count')],
+            [Input('tabla-datos', 'page_current'),
+             Input('tabla-datos', 'page_size'),
+             Input('tabla-datos', 'sort_by'),
+             Input('tabla-datos', 'filter_query')]
+        )
+        def update_table(page_current, page_size, sort_by, filter_query):
+            # Solo la página visible viaja al navegador
+            try:
+                return table_query.page(page_current or 0, page_size, sort_by, filter_query)
+            except ValueError:
+                return [], 1
+
+        # Los toggles solo cambian la UI: se resuelven en el navegador, sin ir al servidor
+        toggle = "function(n_clicks, is_open) { return n_clicks ? !is_open : is_open; }"
+        self.app.clientside_callback(
+            toggle,
             Output("collapse", "is_open"),
             [Input("collapse-button", "n_clicks")],
             [State("collapse", "is_open")],
         )
-        def toggle_collapse(n_clicks, is_open):
-            if n_clicks:
-                return not is_open
-            return is_open
-
-        @self.app.callback(
+        self.app.clientside_callback(
+            toggle,
             Output("offcanvas-scrollable", "is_open"),
             Input("open-offcanvas-scrollable", "n_clicks"),
             State("offcanvas-scrollable", "is_open"),
         )
-        def toggle_offcanvas_scrollable(n1, is_open):
-            if n1:
-                return not is_open
-            return is_open
         
         @self.app.callback(
             Output("feedback-message", "children"),
             [Input("submit-feedback", "n_clicks")],  # Corrected 'n-clicks' to 'n_clicks'
             [State("user-feedback", "value"),  # Corrected 'user-feedabck' to 'user-feedback'
-             State('input-edad', 'value'),
-             State('input-ingresos', 'value'),
-             State('input-genero', 'value'),
-             State('output-prediccion', 'children')]
+             State('ultima-prediccion', 'data')],
+            prevent_initial_call=True
         )
-        def collect_feedback(n_clicks, feedback, edad, ingresos, genero, prediccion):
-            if n_clicks > 0 and feedback:
-                feedback_entry = {
-                    'Edad': edad,
-                    'Ingresos': ingresos,
-                    'Género': genero,
-                    'Predicción': prediccion,
-                    'Feedback': feedback,
-                    'Timestamp': datetime.now().isoformat()
-                }
-                self.feedback_data.append(feedback_entry)
-                # Optionally save to a file or database
-                pd.DataFrame(self.feedback_data).to_csv('feedback.csv', index=False)
+        def collect_feedback(n_clicks, feedback, ultima):
+            if n_clicks and feedback:
+                # Una inserción encolada: el hilo del almacén la confirma en el siguiente lote
+                ultima = ultima or {}
+                record = ultima.get('record') or {}
+                self.feedback.add(
+                    feedback,
+                    prediction_id=ultima.get('id'),
+                    prediccion=ultima.get('prediction'),
+                    edad=record.get('age'),
+                    genero=record.get('gender'),
+                )
                 return "Gracias por tu feedback!"
             return ""
 
@@ -291,16 +326,16 @@ class AirlineApp:
                     
                     # Inputs categóricos
                     html.Label("Género", style={"color": SECONDARY_COLOR_2}),
-                    dcc.Dropdown(id='input-gender', options=[{'label': i, 'value': i} for i in ['Male', 'Female']], value='Male'),
+                    dcc.Dropdown(id='input-gender', options=[{'label': i, 'value': i} for i in CATEGORIES['gender']], value='Male'),
                     
                     html.Label("Tipo de Cliente", style={"color": SECONDARY_COLOR_2}),
-                    dcc.Dropdown(id='input-customer', options=[{'label': i, 'value': i} for i in ['Loyal Customer', 'disloyal Customer']], value='Loyal Customer'),
+                    dcc.Dropdown(id='input-customer', options=[{'label': i, 'value': i} for i in CATEGORIES['customer']], value='Loyal Customer'),
                     
                     html.Label("Tipo de Viaje", style={"color": SECONDARY_COLOR_2}),
-                    dcc.Dropdown(id='input-type_travel', options=[{'label': i, 'value': i} for i in ['Personal Travel', 'Business travel']], value='Personal Travel'),
+                    dcc.Dropdown(id='input-type_travel', options=[{'label': i, 'value': i} for i in CATEGORIES['type_travel']], value='Personal Travel'),
                     
                     html.Label("Clase", style={"color": SECONDARY_COLOR_2}),
-                    dcc.Dropdown(id='input-class_flight', options=[{'label': i, 'value': i} for i in ['Eco', 'Eco Plus', 'Business']], value='Eco'),
+                    dcc.Dropdown(id='input-class_flight', options=[{'label': i, 'value': i} for i in CATEGORIES['class_flight']], value='Eco'),
                     
                     # Inputs numéricos
                     html.Label("Edad", style={"color": SECONDARY_COLOR_2}),
@@ -315,17 +350,12 @@ class AirlineApp:
                             html.Label(service, style={"color": SECONDARY_COLOR_2}),
                             dcc.Slider(
                                 id=f'input-{service.lower().replace(" ", "-")}',
-                                min=1,
-                                max=5,
-                                marks={i: str(i) for i in range(1, 6)},
+                                min=RATING_VALUES[0],
+                                max=RATING_VALUES[-1],
+                                marks={i: str(i) for i in RATING_VALUES},
                                 value=3
                             )
-                        ]) for service in [
-                            'wifi', 'arrival_time', 'online_booking',
-                            'gate_location', 'food_drink', 'online_boarding', 'seat_confort',
-                            'entertainment', 'on_board', 'leg_room',
-                            'baggage_handling', 'checkin', 'inflight_serv', 'cleanliness'
-                        ]
+                        ]) for service in RATING_FIELDS
                     ]),
                     
                     html.Label("Retraso en la Salida (minutos)", style={"color": SECONDARY_COLOR_2}),
@@ -375,9 +405,17 @@ class AirlineApp:
                         html.H2("Tabla de datos", style={"color": PRIMARY_COLOR}),
                         dash_table.DataTable(
                             id='tabla-datos',
-                            data=df.to_dict('records'),
-                            columns=[{'name': col, 'id': col} for col in df.columns],
+                            # Con type numeric el filtro nativo envía "=" / ">" en vez de "contains"
+                            columns=[{'name': col, 'id': col, 'type': 'numeric'} if col in table_query.numeric_columns
+                                     else {'name': col, 'id': col} for col in table_query.columns],
+                            page_current=0,
                             page_size=10,
+                            page_action='custom',
+                            filter_action='custom',
+                            filter_query='',
+                            sort_action='custom',
+                            sort_mode='multi',
+                            sort_by=[],
                             style_table={'overflowX': 'auto'},
                             style_cell={'textAlign': 'left', 'backgroundColor': PRIMARY_COLOR, 'color': TEXT_COLOR},
                         )
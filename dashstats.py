@@ -0,0 +1,203 @@
+"""Peticiones, bytes y tiempo de las llamadas de Dash al servidor Flask.
+
+``DashStats(server)`` engancha ``before_request``/``after_request`` y, para cada
+ruta ``/_dash-*``, acumula peticiones, bytes recibidos y enviados, y tiempo en
+el servidor. Las llamadas a ``/_dash-update-component`` se agrupan por el
+callback (su ``output``). ``GET /_dash-stats`` devuelve el resumen en JSON. Los
+callbacks clientside no aparecen: se ejecutan en el navegador y no llegan al
+servidor.
+
+``python dashstats.py`` reproduce una sesión tipo contra el dashboard con el
+cliente de pruebas de Flask: recorre las cuatro páginas, predice, pagina la
+tabla, abre y cierra la tabla y envía feedback. Lanza los callbacks que
+lanzaría el navegador, salvo los clientside, e imprime las peticiones y los
+bytes de la sesión.
+"""
+import json
+import sys
+import threading
+import time
+
+from flask import g, jsonify, request
+
+
+class DashStats:
+    def __init__(self, server, path='/_dash-stats'):
+        self._lock = threading.Lock()
+        self._calls = {}
+        server.before_request(self._before)
+        server.after_request(self._after)
+        server.add_url_rule(path, 'dash_stats', lambda: jsonify(self.stats()))
+
+    def _before(self):
+        if request.path.startswith('/_dash-'):
+            g.dash_stats_start = time.perf_counter()
+
+    def _after(self, response):
+        start = g.pop('dash_stats_start', None)
+        if start is None:
+            return response
+        key = request.path
+        if key.endswith('/_dash-update-component'):
+            body = request.get_json(silent=True) or {}
+            key = body.get('output', key)
+        sent = response.calculate_content_length() or 0
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            call = self._calls.setdefault(key, [0, 0, 0, 0.0, 0.0])
+            call[0] += 1
+            call[1] += request.content_length or 0
+            call[2] += sent
+            call[3] += elapsed
+            call[4] = max(call[4], elapsed)
+        return response
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+
+    def stats(self):
+        with self._lock:
+            calls = {key: list(values) for key, values in self._calls.items()}
+        by_call = {
+            key: {'requests': n, 'request_bytes': received, 'response_bytes': sent,
+                  'mean_ms': total / n * 1e3, 'max_ms': worst * 1e3}
+            for key, (n, received, sent, total, worst) in sorted(calls.items(), key=lambda kv: -kv[1][3])
+        }
+        return {
+            'requests': sum(c['requests'] for c in by_call.values()),
+            'request_bytes': sum(c['request_bytes'] for c in by_call.values()),
+            'response_bytes': sum(c['response_bytes'] for c in by_call.values()),
+            'server_ms': sum(c['mean_ms'] * c['requests'] for c in by_call.values()),
+            'calls': by_call,
+        }
+
+
+def component_values(*layouts):
+    """id -> {propiedad: valor} de los componentes de los layouts (lo que el navegador tendría renderizado)."""
+    values = {}
+    for layout in layouts:
+        for component in [layout, *(c for _, c in layout._traverse_with_paths())]:
+            component_id = getattr(component, 'id', None)
+            if isinstance(component_id, str):
+                values.setdefault(component_id, {}).update(
+                    {prop: getattr(component, prop) for prop in component._prop_names if hasattr(component, prop)})
+    return values
+
+
+class SessionReplay:
+    """Dispara callbacks como lo haría el renderer de Dash, saltándose los clientside."""
+
+    def __init__(self, client):
+        self.client = client
+        self.dependencies = {d['output']: d for d in client.get('/_dash-dependencies').get_json()}
+        self.values = {}
+        self.skipped = 0
+
+    def _callback(self, component_id, prop):
+        # Callback cuyo output incluye component_id.prop
+        for output, dependency in self.dependencies.items():
+            if f'{component_id}.{prop}' in output.strip('.').split('...'):
+                return output, dependency
+        raise KeyError(f'{component_id}.{prop}')
+
+    def fire(self, component_id, prop, changed=None):
+        """Sin ``changed`` es la llamada inicial al renderizar el componente."""
+        output, dependency = self._callback(component_id, prop)
+        if changed is None and dependency['prevent_initial_call']:
+            return None
+        if dependency['clientside_function'] is not None:
+            self.skipped += 1
+            return None
+        if output.startswith('..'):
+            outputs = [{'id': o.split('.')[0], 'property': o.split('.')[1]} for o in output.strip('.').split('...')]
+        else:
+            outputs = {'id': component_id, 'property': prop}
+
+        def with_values(items):
+            return [{**item, 'value': self.values.get(item['id'], {}).get(item['property'])} for item in items]
+
+        body = {
+            'output': output,
+            'outputs': outputs,
+            'inputs': with_values(dependency['inputs']),
+            'state': with_values(dependency['state']),
+            'changedPropIds': [changed] if changed else [],
+        }
+        response = self.client.post('/_dash-update-component', json=body)
+        if response.status_code == 200:
+            # Las salidas pasan a ser el estado del "navegador" (p. ej. children de page-content)
+            for component, props in response.get_json()['response'].items():
+                self.values.setdefault(component, {}).update(props)
+        return response
+
+    def set(self, component_id, prop, value):
+        self.values.setdefault(component_id, {})[prop] = value
+
+
+def run_session(dash_app, pages):
+    """Sesión tipo; ``pages`` es {valor del dropdown: función que construye el layout}."""
+    client = dash_app.server.test_client()
+    client.get('/')
+    client.get('/_dash-layout')
+    replay = SessionReplay(client)
+    replay.fire('page-content', 'children')
+
+    def show(page, initial):
+        replay.set('page-dropdown', 'value', page)
+        replay.fire('page-content', 'children', 'page-dropdown.value')
+        # Los componentes nuevos de la página disparan sus callbacks iniciales
+        replay.values.update(component_values(pages[page]()))
+        for component_id, prop in initial:
+            replay.fire(component_id, prop)
+
+    page_2 = [('output-prediccion', 'children')]
+    page_3 = [('tabla-datos', 'data'), ('collapse', 'is_open'), ('feedback-message', 'children')]
+    for lap in range(2):
+        if lap:
+            show('main-page', [])
+        show('page-2', page_2)
+        replay.set('submit-button', 'n_clicks', 1)
+        replay.fire('output-prediccion', 'children', 'submit-button.n_clicks')
+        show('page-3', page_3)
+        for clicks in range(1, 5):
+            replay.set('collapse-button', 'n_clicks', clicks)
+            replay.fire('collapse', 'is_open', 'collapse-button.n_clicks')
+            replay.values['collapse']['is_open'] = clicks % 2 == 1
+        for page in range(1, 4):
+            replay.set('tabla-datos', 'page_current', page)
+            replay.fire('tabla-datos', 'data', 'tabla-datos.page_current')
+        replay.set('user-feedback', 'value', 'correct')
+        replay.set('submit-feedback', 'n_clicks', 1)
+        replay.fire('feedback-message', 'children', 'submit-feedback.n_clicks')
+        show('game-page', [])
+    return replay
+
+
+def main():
+    import os
+
+    os.environ.setdefault('PREDICTION_BACKEND', 'inprocess')
+    import app as dashboard
+
+    instance = dashboard.AirlineApp()
+    # Con DASH_STATS=1 el dashboard ya la registra; si no (por defecto), se engancha aquí
+    stats = getattr(instance, 'stats', None) or DashStats(dashboard.server)
+    pages = {'main-page': instance.main_page_content, 'page-2': instance.page_2_content,
+             'page-3': instance.page_3_content, 'game-page': instance.game_page_content}
+    run_session(instance.app, pages)  # calentamiento: modelo, índices de la tabla, layouts
+    stats.reset()
+    replay = run_session(instance.app, pages)
+    report = stats.stats()
+    instance.feedback.close()
+    print(f"{report['requests']} requests, {report['request_bytes']} B sent, {report['response_bytes']} B received, "
+          f"{report['server_ms']:.1f} ms in the server, {replay.skipped} clientside callbacks skipped")
+    for key, call in report['calls'].items():
+        print(f"  {call['requests']:3d} x {key[:70]:70s} {call['response_bytes'] / call['requests']:8.0f} B "
+              f"{call['mean_ms']:7.2f} ms")
+    if '--json' in sys.argv:
+        print(json.dumps(report, indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Carga del dataset del dashboard desde una caché columnar mapeada en memoria.
+
+La primera vez el CSV se convierte a un directorio con un ``.npy`` por columna
+(categorías como códigos, valoraciones como int8, enteros reducidos al tipo más
+pequeño) y un ``meta.json``. En los arranques siguientes las columnas se abren
+con ``np.load(mmap_mode='r')``: no hay parseo y todos los workers comparten las
+mismas páginas del sistema de ficheros. Si cambia el CSV, la caché se reconstruye.
+
+Uso:
+    python dataset.py [ruta_csv]   # compara arranque y RSS frente a pd.read_csv
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CSV = os.path.join('Data', 'airline_passenger_satisfaction.csv')
+CACHE_VERSION = 1
+MAX_CATEGORIES = 255
+
+
+def cache_dir_for(csv_path):
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, '.cache', os.path.splitext(name)[0])
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _compact(series):
+    """(array a guardar, descripción de la columna para meta.json)."""
+    if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+        categorical = series.astype('category')
+        if len(categorical.cat.categories) <= MAX_CATEGORIES:
+            codes = categorical.cat.codes.to_numpy()
+            return codes, {'kind': 'category', 'categories': categorical.cat.categories.tolist()}
+        return series.astype(str).to_numpy(dtype='U'), {'kind': 'string'}
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer').to_numpy(), {'kind': 'numeric'}
+    if pd.api.types.is_float_dtype(series):
+        # Columnas float sin decimales (p. ej. retrasos con NaN) caben en float32 sin pérdida
+        values = series.to_numpy()
+        as32 = values.astype(np.float32)
+        if np.array_equal(as32.astype(values.dtype), values, equal_nan=True):
+            return as32, {'kind': 'numeric'}
+        return values, {'kind': 'numeric'}
+    return series.to_numpy(), {'kind': 'numeric'}
+
+
+def build_cache(csv_path, cache_dir=None):
+    cache_dir = cache_dir or cache_dir_for(csv_path)
+    signature = _source_signature(csv_path)
+    df = pd.read_csv(csv_path)
+
+    parent = os.path.dirname(cache_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix='.building-')
+    columns = []
+    for i, col in enumerate(df.columns):
+        values, info = _compact(df[col])
+        info.update(name=col, file=f'{i:03d}.npy', dtype=values.dtype.str)
+        np.save(os.path.join(tmp, info['file']), np.ascontiguousarray(values))
+        columns.append(info)
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'source': signature, 'rows': len(df), 'columns': columns}, f)
+
+    # Sustituir la caché anterior; si otro worker la ha publicado a la vez, se descarta la nuestra
+    try:
+        if os.path.exists(cache_dir):
+            old = tempfile.mkdtemp(dir=parent, prefix='.old-')
+            os.replace(cache_dir, os.path.join(old, 'cache'))
+            os.replace(tmp, cache_dir)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, cache_dir)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return cache_dir
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_dataset(csv_path=DEFAULT_CSV, cache_dir=None):
+    """DataFrame respaldado por arrays mapeados en memoria (de solo lectura)."""
+    cache_dir = cache_dir or cache_dir_for(csv_path)
+    meta = _read_meta(cache_dir)
+    if meta is None or meta.get('version') != CACHE_VERSION or meta['source'] != _source_signature(csv_path):
+        build_cache(csv_path, cache_dir)
+        meta = _read_meta(cache_dir)
+
+    data = {}
+    for info in meta['columns']:
+        values = np.load(os.path.join(cache_dir, info['file']), mmap_mode='r')
+        if info['kind'] == 'category':
+            data[info['name']] = pd.Categorical.from_codes(values, categories=info['categories'], validate=False)
+        else:
+            data[info['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _measure(mode, csv_path):
+    # Se ejecuta en un proceso limpio para que el RSS no incluya otras cargas
+    import resource
+    import time
+
+    start = time.perf_counter()
+    df = pd.read_csv(csv_path) if mode == 'csv' else load_dataset(csv_path)
+    elapsed = time.perf_counter() - start
+    # Tocar todas las columnas, como hace el dashboard al construir sus índices
+    for col in df.columns:
+        df[col].nunique()
+    with open('/proc/self/statm') as f:
+        rss_pages, shared_pages = (int(x) for x in f.read().split()[1:3])
+    page = resource.getpagesize()
+    print(json.dumps({'seconds': elapsed, 'rss_mb': rss_pages * page / 2**20,
+                      'private_mb': (rss_pages - shared_pages) * page / 2**20}))
+
+
+def report(csv_path=DEFAULT_CSV):
+    load_dataset(csv_path)  # asegura que la caché existe
+    results = {}
+    for mode in ('csv', 'mmap'):
+        out = subprocess.run([sys.executable, __file__, '--measure', mode, csv_path],
+                             capture_output=True, text=True, check=True)
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+    csv, mmap = results['csv'], results['mmap']
+    print(f"{'':<12}{'load':>10}{'RSS':>12}{'private':>12}")
+    for name, r in (('read_csv', csv), ('mmap cache', mmap)):
+        print(f"{name:<12}{r['seconds'] * 1e3:>8.1f}ms{r['rss_mb']:>10.1f}MB{r['private_mb']:>10.1f}MB")
+    print(f"speedup {csv['seconds'] / mmap['seconds']:.1f}x, "
+          f"{csv['private_mb'] - mmap['private_mb']:.1f}MB less private memory per worker")
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--measure':
+        _measure(sys.argv[2], sys.argv[3])
+    else:
+        report(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CSV)
@@ -0,0 +1,230 @@
+"""Capa de consulta del lado del servidor para la tabla de datos del dashboard.
+
+La DataTable de la página 3 usa paginación, filtrado y ordenación ``custom``:
+solo la página visible viaja al navegador. Los filtros y la ordenación se
+resuelven con índices calculados una vez al arrancar:
+
+- columnas de baja cardinalidad: valor -> posiciones de las filas
+- columnas numéricas: posiciones ordenadas por valor (para rangos y ``sort_by``)
+
+``contains``/``startswith`` comparan el texto de la celda tal como lo muestra
+la tabla (``12`` y no ``12.0``), también en columnas numéricas. Los valores
+vacíos quedan al final al ordenar, en ambos sentidos.
+"""
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Operadores que genera el filtro nativo de dash_table (formas simbólicas y "s"/"i" de Dash)
+OPERATORS = {
+    '=': 'eq', 'eq': 'eq', 's=': 'eq', 'i=': 'eq',
+    '!=': 'ne', 'ne': 'ne', 's!=': 'ne', 'i!=': 'ne',
+    '<': 'lt', 'lt': 'lt', 's<': 'lt', 'i<': 'lt',
+    '<=': 'le', 'le': 'le', 's<=': 'le', 'i<=': 'le',
+    '>': 'gt', 'gt': 'gt', 's>': 'gt', 'i>': 'gt',
+    '>=': 'ge', 'ge': 'ge', 's>=': 'ge', 'i>=': 'ge',
+    'contains': 'contains', 'scontains': 'contains', 'icontains': 'icontains',
+    'datestartswith': 'startswith',
+}
+_TERM = re.compile(
+    r'^\s*\{(?P<column>[^}]+)\}\s*(?P<op>' + '|'.join(sorted(map(re.escape, OPERATORS), key=len, reverse=True))
+    + r')\s*(?P<value>.*?)\s*$'
+)
+
+MAX_INDEXED_VALUES = 1000
+# Operadores de texto: el valor del filtro se compara como cadena, sin convertirlo a número
+TEXT_OPERATORS = {'contains', 'icontains', 'startswith'}
+
+
+def parse_filter(filter_query):
+    """``'{Age} >= 30 && {Class} contains "Eco"'`` -> [('Age', 'ge', 30.0), ('Class', 'contains', 'Eco')].
+
+    Con los operadores de texto el valor se queda como cadena: ``{Age} contains 30`` -> ('Age', 'contains', '30').
+    """
+    terms = []
+    for part in (filter_query or '').split(' && '):
+        if not part.strip():
+            continue
+        match = _TERM.match(part)
+        if match is None:
+            raise ValueError(f"Unsupported filter expression: {part!r}")
+        op = OPERATORS[match['op']]
+        value = match['value']
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1].replace('\\' + value[0], value[0])
+        elif op not in TEXT_OPERATORS:
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        terms.append((match['column'].strip(), op, value))
+    return terms
+
+
+class TableQuery:
+    def __init__(self, df, cache_size=64):
+        # Sin reset_index si ya es un RangeIndex: así no se copia un DataFrame mapeado en memoria
+        self.df = df if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 else df.reset_index(drop=True)
+        self.n = len(self.df)
+        self.columns = list(self.df.columns)
+        self._values = {}
+        self._order = {}
+        self._sorted = {}
+        self._valid = {}
+        self._groups = {}
+        self._descending = {}
+        self._texts = {}
+        for col in self.columns:
+            if pd.api.types.is_numeric_dtype(self.df[col]):
+                values = self.df[col].to_numpy()
+                self._values[col] = values
+                order = np.argsort(values, kind='stable')
+                self._order[col] = order
+                self._sorted[col] = values[order]
+                # argsort deja los NaN al final
+                self._valid[col] = int(len(values) - pd.isna(values).sum())
+            # Índice invertido valor -> filas para columnas con pocos valores distintos
+            codes, uniques = pd.factorize(self.df[col], sort=True)
+            if len(uniques) <= MAX_INDEXED_VALUES:
+                by_code = np.argsort(codes, kind='stable')
+                counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+                missing = int((codes < 0).sum())
+                rows = by_code[missing:]
+                # Los vacíos (código -1) al final, como deja argsort los NaN en las numéricas
+                self._order.setdefault(col, np.concatenate([rows, by_code[:missing]]))
+                self._groups[col] = dict(zip(uniques.tolist(), np.split(rows, np.cumsum(counts)[:-1])))
+        self.numeric_columns = [col for col in self.columns if col in self._sorted]
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def _term_rows(self, column, op, value):
+        if column not in self.columns:
+            raise ValueError(f"Unknown column: {column!r}")
+
+        # Rangos numéricos: búsqueda binaria sobre la columna ya ordenada
+        if column in self._sorted and isinstance(value, float) and op in _NUMPY_OPS and op != 'ne':
+            ordered = self._sorted[column][:self._valid[column]]
+            left = np.searchsorted(ordered, value, 'left')
+            right = np.searchsorted(ordered, value, 'right')
+            lo, hi = {
+                'eq': (left, right),
+                'lt': (0, left),
+                'le': (0, right),
+                'gt': (right, len(ordered)),
+                'ge': (left, len(ordered)),
+            }[op]
+            return self._order[column][lo:hi]
+
+        groups = self._groups.get(column)
+        if groups is not None:
+            keys = [k for k in groups if _match(k, op, value)]
+            if not keys:
+                return np.empty(0, dtype=np.intp)
+            return np.concatenate([groups[k] for k in keys])
+
+        # Sin índice (alta cardinalidad): recorrido vectorizado de la columna
+        if column in self._sorted and isinstance(value, float) and op in _NUMPY_OPS:
+            with np.errstate(invalid='ignore'):
+                return np.flatnonzero(_NUMPY_OPS[op](self._values[column], value))
+        if column in self._sorted and op in TEXT_OPERATORS:
+            text = self._text(column)
+            if op == 'icontains':
+                return np.flatnonzero(np.char.find(np.char.lower(text), str(value).lower()) >= 0)
+            if op == 'contains':
+                return np.flatnonzero(np.char.find(text, str(value)) >= 0)
+            return np.flatnonzero(np.char.startswith(text, str(value)))
+        return np.flatnonzero([_match(v, op, value) for v in self.df[column]])
+
+    def _text(self, column):
+        # Texto de cada celda numérica como lo pinta la tabla: enteros sin ".0" y vacío para NaN
+        text = self._texts.get(column)
+        if text is None:
+            text = self._texts[column] = np.array([_text(v) for v in self._values[column].tolist()], dtype=str)
+        return text
+
+    def _descending_order(self, column):
+        # Orden descendente estable con los vacíos al final (invertir el ascendente los subiría arriba)
+        order = self._descending.get(column)
+        if order is None:
+            codes = pd.factorize(self.df[column], sort=True)[0]
+            order = self._descending[column] = np.lexsort((-codes, codes < 0))
+        return order
+
+    def rows(self, filter_query='', sort_by=()):
+        """Posiciones de las filas que cumplen el filtro, en el orden pedido (cacheado)."""
+        sort_key = tuple((s['column_id'], s['direction']) for s in sort_by or ())
+        key = (filter_query or '', sort_key)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        terms = parse_filter(filter_query)
+        if terms:
+            mask = np.ones(self.n, dtype=bool)
+            for column, op, value in terms:
+                term = np.zeros(self.n, dtype=bool)
+                term[self._term_rows(column, op, value)] = True
+                mask &= term
+        else:
+            mask = None
+
+        if not sort_key:
+            result = np.arange(self.n) if mask is None else np.flatnonzero(mask)
+        elif len(sort_key) == 1 and sort_key[0][0] in self._order:
+            column, direction = sort_key[0]
+            order = self._descending_order(column) if direction == 'desc' else self._order[column]
+            result = order if mask is None else order[mask[order]]
+        else:
+            result = np.arange(self.n) if mask is None else np.flatnonzero(mask)
+            # lexsort ordena por la última clave primero; en cada columna los vacíos (código -1) van al final
+            keys = []
+            for column, direction in reversed(sort_key):
+                codes = pd.factorize(self.df[column].iloc[result], sort=True)[0]
+                keys.append(-codes if direction == 'desc' else codes)
+                keys.append(codes < 0)
+            result = result[np.lexsort(keys)]
+
+        self._cache[key] = result
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def page(self, page_current=0, page_size=10, sort_by=(), filter_query=''):
+        """(registros de la página, número de páginas) para la DataTable."""
+        rows = self.rows(filter_query, sort_by)
+        page_count = max(1, -(-len(rows) // page_size))
+        start = page_current * page_size
+        page = self.df.iloc[rows[start:start + page_size]]
+        return page.astype(object).where(page.notna(), None).to_dict('records'), page_count
+
+
+_NUMPY_OPS = {
+    'eq': np.equal, 'ne': np.not_equal, 'lt': np.less,
+    'le': np.less_equal, 'gt': np.greater, 'ge': np.greater_equal,
+}
+
+
+def _text(cell):
+    if cell is None or (isinstance(cell, float) and np.isnan(cell)):
+        return ''
+    if isinstance(cell, float) and cell.is_integer():
+        return str(int(cell))
+    return str(cell)
+
+
+def _match(cell, op, value):
+    if op == 'contains':
+        return str(value) in _text(cell)
+    if op == 'icontains':
+        return str(value).lower() in _text(cell).lower()
+    if op == 'startswith':
+        return _text(cell).startswith(str(value))
+    if op in ('eq', 'ne'):
+        equal = cell == value or _text(cell) == str(value)
+        return equal if op == 'eq' else not equal
+    try:
+        return bool(_NUMPY_OPS[op](cell, value))
+    except TypeError:
+        return False
@@ -0,0 +1,218 @@
+"""Almacén de feedback del dashboard (SQLite, solo inserciones).
+
+- Cada hilo de Dash lee con su propia conexión (``threading.local``); no se
+  comparte un cursor entre hilos.
+- Las escrituras se encolan y un único hilo las confirma por lotes (por tamaño o
+  por tiempo) con un ``executemany``; en modo WAL las lecturas no se bloquean.
+- Cada entrada guarda ``prediction_id``, el id de la fila de la tabla ``data`` de
+  la API con la predicción valorada (NULL si no se registró, p. ej. con
+  write-behind o con el backend ``inprocess``).
+- La exportación a CSV se hace en streaming desde un cursor, sin cargar la tabla.
+
+Uso:
+    python feedback.py [salida.csv] [--since 2024-01-01]   # exporta el feedback
+"""
+import csv
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['id', 'prediction_id', 'edad', 'ingresos', 'genero', 'prediccion', 'feedback', 'timestamp']
+
+_STOP = object()
+# Intentos por lote ante errores transitorios ("database is locked" tras el timeout, disco lleno...)
+MAX_ATTEMPTS = 3
+
+
+class FeedbackStore:
+    def __init__(self, path='feedback.db', batch_size=100, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self._create_schema()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def connection(self):
+        """Conexión del hilo actual (se abre la primera vez que el hilo la pide)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _create_schema(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS feedback (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        prediction_id INTEGER,
+                        edad INTEGER,
+                        ingresos REAL,
+                        genero TEXT,
+                        prediccion TEXT,
+                        feedback TEXT,
+                        timestamp TEXT
+                    )
+                ''')
+                # Bases creadas por versiones anteriores del dashboard no tienen prediction_id
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(feedback)")}
+                if 'prediction_id' not in columns:
+                    conn.execute("ALTER TABLE feedback ADD COLUMN prediction_id INTEGER")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_feedback_timestamp ON feedback (timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_feedback_prediction_id ON feedback (prediction_id)")
+        finally:
+            conn.close()
+
+    def add(self, feedback, prediction_id=None, prediccion=None, edad=None, ingresos=None, genero=None,
+            timestamp=None):
+        """Encola una entrada; se confirma en el siguiente lote del hilo escritor."""
+        self._start()
+        self._queue.put((prediction_id, edad, ingresos, genero, prediccion, feedback,
+                         timestamp or datetime.now().isoformat()))
+
+    def _start(self):
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='feedback-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        conn = self._connect()
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._write(conn, batch)
+            finally:
+                # Siempre, aunque el lote falle: si no, flush() y export_csv se quedarían esperando en join()
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    def _write(self, conn, batch):
+        # Un fallo no para el hilo: se reintenta y, si persiste, el lote se descarta y queda en el log
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                with conn:
+                    conn.executemany('''
+                        INSERT INTO feedback (prediction_id, edad, ingresos, genero, prediccion, feedback, timestamp)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except sqlite3.Error as e:
+                if attempt < MAX_ATTEMPTS:
+                    logger.warning("feedback batch of %d rows failed (%s), retrying", len(batch), e)
+                    time.sleep(0.1 * attempt)
+                    continue
+                self.failed += len(batch)
+                logger.exception("feedback batch of %d rows dropped after %d attempts: %s", len(batch), attempt, batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("feedback batch of %d rows dropped: %s", len(batch), batch)
+                return
+
+    def flush(self):
+        """Espera a que todo lo encolado esté confirmado."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        with self._thread_lock:
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join()
+                self._thread = None
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+    def iter_rows(self, since=None, chunk_size=1000):
+        """Filas en orden de timestamp (usa el índice), leídas por bloques."""
+        sql = f"SELECT {', '.join(COLUMNS)} FROM feedback"
+        params = ()
+        if since is not None:
+            sql += " WHERE timestamp >= ?"
+            params = (since,)
+        cursor = self.connection().execute(sql + " ORDER BY timestamp", params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+
+    def export_csv(self, path, since=None):
+        """Escribe el CSV en streaming y lo publica de forma atómica; devuelve las filas escritas."""
+        self.flush()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.feedback-', suffix='.csv')
+        n = 0
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                for row in self.iter_rows(since):
+                    writer.writerow(row)
+                    n += 1
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return n
+
+    def stats(self):
+        return {"pending": self._queue.qsize(), "written": self.written, "batches": self.batches,
+                "failed": self.failed}
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    since = None
+    if '--since' in args:
+        i = args.index('--since')
+        since = args[i + 1]
+        del args[i:i + 2]
+    out = args[0] if args else 'feedback.csv'
+    store = FeedbackStore(os.getenv('FEEDBACK_DB', 'feedback.db'))
+    print(f"{store.export_csv(out, since)} rows exported to {out}")
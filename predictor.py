@@ -0,0 +1,111 @@
+"""Backends de predicción para el callback del dashboard.
+
+PREDICTION_BACKEND elige cómo obtiene ``actualizar_resultados`` la predicción:
+
+- ``http`` (por defecto): POST a la API con una ``requests.Session`` compartida
+  (conexiones keep-alive en pool, timeouts y reintentos).
+- ``inprocess``: carga el mismo pipeline con el registro de la API y predice en
+  el propio proceso de Dash, sin el salto HTTP por loopback. Las predicciones
+  se comparten entre usuarios a través de la caché de la API. En este modo no
+  se registran en la tabla ``data``.
+"""
+import os
+import threading
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import PredictionCache, cached_prediction
+from encoder import FIELDS
+
+
+class HttpPredictor:
+    def __init__(self, url=None, connect_timeout=None, read_timeout=None, retries=None, pool_size=None):
+        self.url = url or os.getenv('PREDICTION_API_URL', 'http://127.0.0.1:8000/predict/')
+        self.timeout = (
+            float(connect_timeout or os.getenv('PREDICTION_CONNECT_TIMEOUT', 2)),
+            float(read_timeout or os.getenv('PREDICTION_READ_TIMEOUT', 10)),
+        )
+        retries = int(retries if retries is not None else os.getenv('PREDICTION_RETRIES', 2))
+        pool_size = int(pool_size or os.getenv('PREDICTION_POOL_SIZE', 10))
+        # POST /predict/ no es idempotente: cada petición que llega a la API inserta una fila en ``data`` y
+        # suma al resumen. Solo se reintenta si no se pudo conectar, cuando la petición aún no ha salido.
+        predict_retry = Retry(total=retries, connect=retries, read=0, status=0, other=0,
+                              backoff_factor=0.2, allowed_methods=None)
+        # GET /explain/importances sí es idempotente: también se reintentan los 502/503/504 de un reinicio
+        importances_retry = Retry(total=retries, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                                  allowed_methods=frozenset({'GET'}))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=predict_retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.importances_url = urljoin(self.url, '/explain/importances')
+        # requests usa el adaptador montado con el prefijo más largo que coincide con la URL
+        self.session.mount(self.importances_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                                             max_retries=importances_retry))
+        self._importances = None
+
+    def predict(self, record, explain=False):
+        params = {'explain': 'true'} if explain else None
+        response = self.session.post(self.url, json=record, params=params, timeout=self.timeout)
+        response.raise_for_status()  # Esto lanzará una excepción para códigos de estado HTTP no exitosos
+        return response.json()
+
+    def importances(self, version=None):
+        # Se piden de nuevo solo cuando la API responde con otra versión del modelo
+        if self._importances is None or (version is not None and self._importances['model_version'] != version):
+            response = self.session.get(self.importances_url, timeout=self.timeout)
+            response.raise_for_status()
+            self._importances = response.json()
+        return self._importances['importances']
+
+
+class InProcessPredictor:
+    def __init__(self, registry=None):
+        from registry import ModelRegistry
+
+        self.registry = registry or ModelRegistry()
+        self.cache = PredictionCache(
+            maxsize=int(os.getenv('PREDICTION_CACHE_SIZE', 4096)),
+            ttl=float(os.getenv('PREDICTION_CACHE_TTL', 3600)),
+            version=lambda: self.registry.version,
+            check_interval=0,
+        )
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _bundle(self):
+        if not self._started:
+            with self._lock:
+                if not self._started:
+                    self.registry.load()
+                    self.registry.start_watcher()
+                    self._started = True
+        return self.registry.get()
+
+    def predict(self, record, explain=False):
+        # Misma forma de respuesta que POST /predict/ (y ?explain=true)
+        if any(record.get(f) is None for f in FIELDS):
+            return {"msg": "error"}
+        bundle = self._bundle()
+        prediction, _ = cached_prediction(self.cache, bundle, record)
+        response = {"msg": "ok", "data": record, "prediction": prediction, "id": None}
+        if explain and bundle.explainer is not None:
+            response.update(model_version=bundle.version, **bundle.explainer.explain(record))
+        return response
+
+    def importances(self, version=None):
+        explainer = self._bundle().explainer
+        return explainer.importances if explainer is not None else {}
+
+
+def make_predictor(backend=None):
+    backend = backend or os.getenv('PREDICTION_BACKEND', 'http')
+    if backend == 'inprocess':
+        return InProcessPredictor()
+    if backend == 'http':
+        return HttpPredictor()
+    raise ValueError(f"Unknown PREDICTION_BACKEND: {backend!r}")
@@ -0,0 +1,252 @@
+"""Ficheros estáticos del dashboard (``game/`` y ``assets/``) con caché HTTP.
+
+Al arrancar se recorre el directorio una vez: para cada fichero se guarda su
+sha256, su tipo MIME y, si es texto (html, js, css, svg, json), copias gzip y
+brotli. Brotli solo se genera si está instalado el paquete ``brotli``. El
+digest del árbol completo forma la URL versionada ``<prefijo>/_v/<digest>/<ruta>``:
+
+- Las URLs versionadas se sirven con ``Cache-Control: immutable`` y un año de
+  vida. Si cambia cualquier fichero, cambia el digest y con él la URL, así que
+  el navegador no vuelve a pedirlas mientras no haya un despliegue nuevo. Al
+  ser un prefijo de directorio, las rutas relativas de ``fly.html`` y
+  ``game.js`` (``game.js``, ``images/...``, ``audio/...``) heredan la versión
+  sin reescribir nada.
+- Las URLs sin versión, o con un digest antiguo, se sirven con ``no-cache``: el
+  navegador revalida con ``If-None-Match`` y recibe un 304 sin cuerpo.
+
+Todas las respuestas llevan ETag y Last-Modified, y aceptan ``Range`` (206/416)
+con ``Response.make_conditional`` de werkzeug. Con ``Range`` se sirve siempre
+la versión sin comprimir. Los ficheros de hasta ``max_file_size`` se guardan en
+memoria (LRU acotada a ``cache_bytes``); los mayores se leen del disco con
+``send_file``. Los cambios en disco se ven al reiniciar el dashboard.
+
+``python static.py build salida/`` escribe los árboles versionados con sus
+``.gz``/``.br`` para servirlos desde nginx (``gzip_static``/``brotli_static``)
+o un CDN, sin pasar por el worker de Dash.
+
+Uso:
+    python static.py build salida/ [--bench]
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, abort, request, send_file
+
+COMPRESSIBLE = {'.html', '.js', '.css', '.svg', '.json', '.txt', '.map'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Una copia comprimida que no ahorra al menos un 10 % no compensa el coste de descomprimir
+MIN_SAVING = 0.9
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compress_variants(data):
+    """{'br': bytes, 'gzip': bytes} con las codificaciones disponibles que reducen el tamaño."""
+    variants = {}
+    brotli = _brotli()
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    variants['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+    return {name: body for name, body in variants.items() if len(body) <= len(data) * MIN_SAVING}
+
+
+class Asset:
+    def __init__(self, root, relpath):
+        self.relpath = relpath
+        self.path = os.path.join(root, relpath)
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.mtime = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+        self.mimetype = mimetypes.guess_type(relpath)[0] or 'application/octet-stream'
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.etag = self.sha256[:20]
+        self.variants = {}
+        if os.path.splitext(relpath)[1].lower() in COMPRESSIBLE:
+            self.variants = compress_variants(data)
+
+
+class StaticAssets:
+    def __init__(self, directory, url_prefix, max_file_size=4 << 20, cache_bytes=64 << 20):
+        self.directory = os.path.abspath(directory)
+        self.url_prefix = url_prefix.rstrip('/')
+        self.max_file_size = max_file_size
+        self.cache_bytes = cache_bytes
+        self.assets = {}
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            for name in sorted(filenames):
+                if name.startswith('.'):
+                    continue
+                relpath = os.path.relpath(os.path.join(dirpath, name), self.directory).replace(os.sep, '/')
+                self.assets[relpath] = Asset(self.directory, relpath)
+        tree = hashlib.sha256()
+        for relpath, asset in sorted(self.assets.items()):
+            tree.update(f"{relpath}\0{asset.sha256}\n".encode())
+        self.digest = tree.hexdigest()[:12]
+
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def url(self, relpath):
+        """URL versionada (inmutable) de un fichero del directorio."""
+        if relpath not in self.assets:
+            raise KeyError(f"unknown static asset: {relpath}")
+        return f"{self.url_prefix}/_v/{self.digest}/{relpath}"
+
+    def register(self, server, endpoint, unversioned=True):
+        # La regla con el segmento fijo '_v' tiene prioridad sobre la de ruta libre (la propia o la de Dash
+        # en /assets/, que entonces se registra con unversioned=False)
+        server.add_url_rule(f"{self.url_prefix}/_v/<digest>/<path:path>", f"{endpoint}_versioned",
+                            lambda digest, path: self.serve(path, digest == self.digest))
+        if unversioned:
+            server.add_url_rule(f"{self.url_prefix}/<path:path>", endpoint, lambda path: self.serve(path, False))
+
+    def _body(self, asset):
+        """Contenido del fichero desde la caché en memoria, o None si es demasiado grande para ella."""
+        if asset.size > self.max_file_size:
+            return None
+        with self._lock:
+            body = self._cache.get(asset.relpath)
+            if body is not None:
+                self._cache.move_to_end(asset.relpath)
+                self.hits += 1
+                return body
+            self.misses += 1
+        with open(asset.path, 'rb') as f:
+            body = f.read()
+        with self._lock:
+            if asset.relpath not in self._cache:
+                self._cache[asset.relpath] = body
+                self._cached_bytes += len(body)
+                while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(evicted)
+        return body
+
+    def _encoding(self, asset):
+        # Con Range se sirve la representación sin comprimir (los bytes pedidos son del fichero original)
+        if not asset.variants or 'Range' in request.headers:
+            return None
+        for encoding in ('br', 'gzip'):
+            if encoding in asset.variants and request.accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+    def serve(self, path, immutable):
+        asset = self.assets.get(path)
+        if asset is None:
+            abort(404)
+        encoding = self._encoding(asset)
+        if encoding is not None:
+            body = asset.variants[encoding]
+            response = Response(body, mimetype=asset.mimetype)
+            response.set_etag(f"{asset.etag}-{encoding}")
+            response.headers['Content-Encoding'] = encoding
+        else:
+            body = self._body(asset)
+            if body is None:
+                response = send_file(asset.path, mimetype=asset.mimetype, etag=asset.etag,
+                                     last_modified=asset.mtime, conditional=False)
+            else:
+                response = Response(body, mimetype=asset.mimetype)
+                response.set_etag(asset.etag)
+        response.last_modified = asset.mtime
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        response = response.make_conditional(request, accept_ranges=encoding is None,
+                                              complete_length=asset.size if encoding is None else None)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self.assets),
+                'digest': self.digest,
+                'cached_files': len(self._cache),
+                'cached_bytes': self._cached_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'compressed_files': sum(1 for a in self.assets.values() if a.variants),
+            }
+
+    def build(self, output):
+        """Copia el árbol a ``output/<digest>/`` con sus variantes ``.gz``/``.br``."""
+        target = os.path.join(output, self.digest)
+        for relpath, asset in self.assets.items():
+            destination = os.path.join(target, *relpath.split('/'))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copy2(asset.path, destination)
+            for encoding, body in asset.variants.items():
+                with open(destination + ('.br' if encoding == 'br' else '.gz'), 'wb') as f:
+                    f.write(body)
+        return target
+
+
+def _bench(assets, n=500):
+    """Compara con ``send_from_directory`` (lo que servía ``/game/`` antes) en el cliente de pruebas de Flask."""
+    import time
+
+    from flask import Flask, send_from_directory
+
+    server = Flask(__name__)
+    assets.register(server, 'bench_static')
+    server.add_url_rule('/baseline/<path:path>', 'baseline', lambda path: send_from_directory(assets.directory, path))
+    client = server.test_client()
+    audio = 'audio/new_york.mp3'
+    cases = [
+        ('game.js', 'game.js', {'Accept-Encoding': 'gzip, br'}),
+        ('game.js revalidation', 'game.js', {'If-None-Match': f'"{assets.assets["game.js"].etag}"'}),
+        ('mp3 Range 64 KiB', audio, {'Range': 'bytes=1048576-1114111'}),
+        ('mp3 full', audio, {}),
+    ]
+    for label, relpath, headers in cases:
+        row = [f"{label:22s}"]
+        for name, url in [('baseline', f'/baseline/{relpath}'), ('static', assets.url(relpath))]:
+            sent = headers
+            if name == 'baseline' and 'If-None-Match' in headers:
+                sent = {'If-None-Match': client.get(url).headers['ETag']}
+            start = time.perf_counter()
+            for _ in range(n):
+                response = client.get(url, headers=sent)
+                size = len(response.data)
+            row.append(f"{name} {response.status_code} {size:8d} B {(time.perf_counter() - start) / n * 1e6:7.0f} µs")
+        print('  '.join(row))
+    print(assets.stats())
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'build':
+        sys.exit(__doc__.split('Uso:')[1])
+    for directory in ('game', 'assets'):
+        static = StaticAssets(directory, f'/{directory}')
+        print(f"{directory}/ -> {static.build(os.path.join(sys.argv[2], directory))}")
+        if '--bench' in sys.argv and directory == 'game':
+            _bench(static)
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import joblib
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Los módulos de la API se importan como hermanos (se ejecutan con cwd=api) y los del dashboard desde la raíz
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'api')]
+# db.py construye el engine al importarse; los tests no tocan MySQL
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+
+@pytest.fixture(scope='session')
+def pipeline():
+    return joblib.load(os.getenv('MODEL_PATH', os.path.join(ROOT, 'model_pipeline.pkl')))
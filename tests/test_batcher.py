@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+from batcher import MicroBatcher
+
+
+def slow_double(items, delay=0.2):
+    time.sleep(delay)
+    return [2 * item for item in items]
+
+
+def test_batches_concurrent_items():
+    async def run():
+        batcher = MicroBatcher(lambda items: [2 * i for i in items], max_batch_size=8, max_wait=0.01)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(20)))
+        await batcher.close()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [2 * i for i in range(20)]
+    assert stats['batches'] < 20 and stats['pending'] == 0
+
+
+def test_close_dispatches_pending_items_without_blocking_the_loop():
+    async def run():
+        # Ventana larga: sin close los elementos seguirían esperando al temporizador
+        batcher = MicroBatcher(slow_double, max_batch_size=4, max_wait=60)
+        submitted = [asyncio.ensure_future(batcher.submit(i)) for i in range(10)]
+        await asyncio.sleep(0)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        clock = asyncio.ensure_future(ticker())
+        start = time.perf_counter()
+        await batcher.close()
+        elapsed = time.perf_counter() - start
+        clock.cancel()
+        return await asyncio.gather(*submitted), elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(run())
+    assert results == [2 * i for i in range(10)]
+    assert elapsed < 5
+    # Tres lotes de 0.2 s en un hilo: el event loop siguió atendiendo mientras tanto
+    assert ticks >= 20
+
+
+def test_submit_after_close_fails():
+    async def run():
+        batcher = MicroBatcher(slow_double)
+        await batcher.close()
+        await batcher.submit(1)
+
+    with pytest.raises(RuntimeError, match='closed'):
+        asyncio.run(run())
+
+
+def test_close_from_another_loop_fails_pending_items():
+    batcher = MicroBatcher(slow_double, max_wait=60)
+    loop = asyncio.new_event_loop()
+    future = loop.run_until_complete(_enqueue(batcher))
+    asyncio.run(batcher.close())
+    with pytest.raises(RuntimeError, match='before the item was dispatched'):
+        future.result()
+    loop.close()
+
+
+async def _enqueue(batcher):
+    task = asyncio.ensure_future(batcher.submit(1))
+    await asyncio.sleep(0)
+    # El future del elemento, sin esperar a que salga su lote
+    return batcher._pending[0][1]
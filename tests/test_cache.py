@@ -0,0 +1,51 @@
+import pytest
+
+from cache import PredictionCache, cached_prediction, cached_predictions, canonical_key
+from registry import ModelBundle, warmup_records
+
+
+@pytest.fixture(scope='module')
+def bundle():
+    from registry import DEFAULT_MODEL_PATH
+
+    return ModelBundle(DEFAULT_MODEL_PATH)
+
+
+def scored(bundle, record):
+    proba = bundle.classifier.predict_proba(bundle.features.encode(record))[0]
+    return int(bundle.classifier.classes_[proba.argmax()]), float(proba[1])
+
+
+def test_integral_floats_share_a_key():
+    base = warmup_records()[0]
+    assert canonical_key({**base, 'wifi': float(base['wifi'])}) == canonical_key(base)
+
+
+def test_padded_strings_do_not_share_a_key():
+    base = warmup_records()[0]
+    assert canonical_key({**base, 'class_flight': f" {base['class_flight']}"}) != canonical_key(base)
+
+
+def test_cached_results_match_direct_scoring(bundle):
+    # Cada clave de la caché corresponde a una sola puntuación: registros con y sin espacios, y 3 frente a 3.0
+    cache = PredictionCache(maxsize=1024, check_interval=0)
+    base = warmup_records()[0]
+    variants = [base, {**base, 'class_flight': f" {base['class_flight']}", 'type_travel': f" {base['type_travel']}"},
+                {**base, 'wifi': float(base['wifi'])}]
+    # Primero el lote y después uno a uno, como la secuencia que envenenaba la caché
+    cached = cached_predictions(cache, bundle, variants, mode='check')
+    cached += [cached_prediction(cache, bundle, record) for record in reversed(variants)]
+    for record, got in zip(variants + variants[::-1], cached):
+        assert got == scored(bundle, record), record
+
+
+def test_records_share_an_entry_only_if_they_score_the_same(bundle):
+    cache = PredictionCache(maxsize=4096, check_interval=0)
+    records = warmup_records()
+    padded = [{**r, 'customer': f"{r['customer']} "} for r in records]
+    floats = [{**r, 'distance': float(r['distance'])} for r in records]
+    by_key = {}
+    for record in records + padded + floats:
+        by_key.setdefault(canonical_key(record), set()).add(scored(bundle, record))
+        assert cached_prediction(cache, bundle, record) == scored(bundle, record)
+    assert all(len(results) == 1 for results in by_key.values())
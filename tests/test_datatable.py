@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datatable import MAX_INDEXED_VALUES, TableQuery, parse_filter
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(0)
+    n = 3 * MAX_INDEXED_VALUES
+    delay = rng.integers(0, 200, n).astype(float)
+    delay[rng.choice(n, 50, replace=False)] = np.nan
+    return pd.DataFrame({
+        'Age': rng.integers(7, 86, n),                      # pocos valores: índice invertido
+        'Flight Distance': rng.permutation(n) + 31,         # alta cardinalidad: recorrido vectorizado
+        'Arrival Delay': delay,                             # float con NaN
+        'Class': rng.choice(['Eco', 'Eco Plus', 'Business'], n),
+    })
+
+
+@pytest.fixture(scope='module')
+def table(frame):
+    return TableQuery(frame)
+
+
+def expected(frame, mask):
+    return sorted(np.flatnonzero(mask.to_numpy()))
+
+
+def test_text_operators_keep_the_raw_token():
+    assert parse_filter('{Age} scontains 30') == [('Age', 'contains', '30')]
+    assert parse_filter('{Age} s= 30') == [('Age', 'eq', 30.0)]
+
+
+@pytest.mark.parametrize('column', ['Age', 'Flight Distance', 'Arrival Delay'])
+@pytest.mark.parametrize('token', ['3', '30', '100'])
+def test_default_operator_on_numeric_columns(frame, table, column, token):
+    # Columna sin type: Dash manda "scontains" y se compara con el texto que muestra la tabla
+    text = frame[column].map(lambda v: '' if pd.isna(v) else str(int(v)))
+    assert sorted(table.rows(f'{{{column}}} scontains {token}')) == expected(frame, text.str.contains(token))
+    assert sorted(table.rows(f'{{{column}}} datestartswith {token}')) == expected(frame, text.str.startswith(token))
+
+
+@pytest.mark.parametrize('column', ['Age', 'Flight Distance', 'Arrival Delay'])
+@pytest.mark.parametrize('op, compare', [
+    ('=', lambda s, v: s == v), ('s=', lambda s, v: s == v), ('!=', lambda s, v: s != v),
+    ('<', lambda s, v: s < v), ('<=', lambda s, v: s <= v), ('>', lambda s, v: s > v), ('>=', lambda s, v: s >= v),
+])
+def test_relational_operators_on_numeric_columns(frame, table, column, op, compare):
+    value = frame[column].median()
+    rows = table.rows(f'{{{column}}} {op} {value:g}')
+    # Las celdas vacías no cumplen ninguna comparación, tampoco "!="
+    assert sorted(rows) == expected(frame, compare(frame[column], value) & frame[column].notna())
+
+
+def test_combined_terms(frame, table):
+    rows = table.rows('{Age} >= 30 && {Class} contains "Eco"')
+    assert sorted(rows) == expected(frame, (frame['Age'] >= 30) & frame['Class'].str.contains('Eco'))
+
+
+@pytest.mark.parametrize('direction', ['asc', 'desc'])
+def test_sort_keeps_missing_values_last(frame, table, direction):
+    values = frame['Arrival Delay'].to_numpy()[table.rows('', [{'column_id': 'Arrival Delay', 'direction': direction}])]
+    missing = int(np.isnan(values).sum())
+    assert missing and np.isnan(values[-missing:]).all()
+    present = values[:-missing]
+    assert (np.diff(present) >= 0).all() if direction == 'asc' else (np.diff(present) <= 0).all()
+
+
+def test_multi_column_sort_keeps_missing_values_last(frame, table):
+    sort_by = [{'column_id': 'Class', 'direction': 'desc'}, {'column_id': 'Arrival Delay', 'direction': 'desc'}]
+    rows = table.rows('', sort_by)
+    ordered = frame.iloc[rows]
+    reference = frame.sort_values(['Class', 'Arrival Delay'], ascending=False, na_position='last', kind='stable')
+    assert ordered[['Class', 'Arrival Delay']].equals(reference[['Class', 'Arrival Delay']])
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from encoder import CATEGORIES, COLUMNS, FIELDS, RATING_FIELDS, FeatureEncoder, age_groups, which_age
+
+
+def dataframe_rows(records):
+    # Camino anterior de crud.post_data: un DataFrame por petición con el grupo de edad de which_age
+    df = pd.DataFrame([[*(r[f] for f in FIELDS), which_age(r['age'])] for r in records], columns=COLUMNS)
+    df['Age Group'] = df['Age Group'].astype('category')
+    return df
+
+
+@pytest.fixture(scope='module')
+def encoder(pipeline):
+    return FeatureEncoder(pipeline)
+
+
+@pytest.fixture(scope='module')
+def records():
+    rng = np.random.default_rng(0)
+    n = 2000
+    records = []
+    for i in range(n):
+        record = {field: values[rng.integers(len(values))] for field, values in CATEGORIES.items()}
+        record.update({field: int(v) for field, v in zip(RATING_FIELDS, rng.integers(0, 6, len(RATING_FIELDS)))})
+        record.update(age=int(rng.integers(0, 100)), distance=int(rng.integers(30, 5000)),
+                      departure_delay=float(rng.exponential(15)), arrival_dealy=float(rng.exponential(15)))
+        records.append(record)
+    # Bordes de los grupos de edad y categorías que no estaban en el entrenamiento
+    records += [{**records[0], 'age': age} for age in (0, 4, 5, 99)]
+    records += [{**records[1], 'class_flight': ' Business', 'gender': 'Other'}]
+    return records
+
+
+def test_matches_the_dataframe_preprocessor(pipeline, encoder, records):
+    expected = pipeline.named_steps['preprocessor'].transform(dataframe_rows(records))
+    expected = expected.toarray() if hasattr(expected, 'toarray') else expected
+    np.testing.assert_allclose(encoder.encode_records(records), expected, rtol=0, atol=1e-12)
+
+
+def test_matches_the_pipeline_probabilities(pipeline, encoder, records):
+    clf = pipeline.steps[-1][1]
+    np.testing.assert_allclose(clf.predict_proba(encoder.encode_records(records)),
+                               pipeline.predict_proba(dataframe_rows(records)), rtol=0, atol=1e-12)
+
+
+def test_single_record_matches_batch(encoder, records):
+    batch = encoder.encode_records(records[:50])
+    for i, record in enumerate(records[:50]):
+        np.testing.assert_array_equal(encoder.encode(record)[0], batch[i])
+
+
+def test_age_groups_match_which_age():
+    ages = np.arange(0, 100)
+    assert list(age_groups(ages)) == [which_age(a) for a in ages]
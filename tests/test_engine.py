@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pytest
+
+import engine
+from engine import CompiledPipeline, check_parity, load_holdout, random_frame
+
+TOLERANCE = 1e-9
+
+
+@pytest.fixture(scope='module')
+def compiled(pipeline):
+    return CompiledPipeline(pipeline)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_parity_on_sampled_rows(pipeline, compiled, seed):
+    X = random_frame(compiled.encoder, 5000, seed=seed)
+    np.testing.assert_allclose(compiled.predict_proba(X), pipeline.predict_proba(X), rtol=0, atol=TOLERANCE)
+    np.testing.assert_array_equal(compiled.predict(X), pipeline.predict(X))
+
+
+def test_parity_on_single_rows(pipeline, compiled):
+    X = random_frame(compiled.encoder, 50, seed=2)
+    for i in range(len(X)):
+        row = X.iloc[[i]]
+        np.testing.assert_allclose(compiled.predict_proba(row), pipeline.predict_proba(row), rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.skipif(not os.getenv('PATH_TO_DATA'), reason='PATH_TO_DATA not set')
+def test_parity_on_holdout(pipeline, compiled):
+    max_diff, same_class = check_parity(pipeline, load_holdout(os.environ['PATH_TO_DATA']), compiled)
+    assert max_diff < TOLERANCE and same_class
+
+
+def test_compiled_forest_matches_classifier(pipeline, compiled):
+    clf = pipeline.steps[-1][1]
+    assert engine.supports(clf)
+    Xt = compiled.transform(random_frame(compiled.encoder, 1000, seed=3))
+    np.testing.assert_allclose(compiled.forest.decision_function(Xt), clf.decision_function(Xt), rtol=0, atol=TOLERANCE)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import engine
+from encoder import FIELDS
+from explain import Explainer
+
+
+@pytest.fixture(scope='module')
+def explainer(pipeline):
+    return Explainer(pipeline)
+
+
+@pytest.fixture(scope='module')
+def frame(explainer):
+    return engine.random_frame(explainer.features, 2000, seed=4)
+
+
+def test_contributions_add_up_to_the_log_odds(pipeline, explainer, frame):
+    # Aditividad: base + suma de contribuciones == log-odds del modelo de sklearn
+    X = explainer.features.encode_frame(frame)
+    logodds = explainer.forest.link_scale * pipeline.steps[-1][1].decision_function(X)
+    total = explainer.base_value + explainer.contributions(X).sum(axis=1)
+    np.testing.assert_allclose(total, logodds, rtol=0, atol=1e-9)
+
+
+def test_explain_matches_explain_records(explainer, frame):
+    records = [dict(zip(FIELDS, row[:len(FIELDS)])) for row in frame.head(20).itertuples(index=False)]
+    batch = explainer.explain_records(records)
+    for record, expected in zip(records, batch):
+        got = explainer.explain(record)
+        assert got['base_value'] == expected['base_value']
+        np.testing.assert_allclose([got['contributions'][f] for f in FIELDS],
+                                   [expected['contributions'][f] for f in FIELDS], rtol=0, atol=1e-12)
+
+
+def test_importances_cover_every_field(pipeline, explainer):
+    assert set(explainer.importances) == set(FIELDS)
+    assert sum(explainer.importances.values()) == pytest.approx(pipeline.steps[-1][1].feature_importances_.sum())